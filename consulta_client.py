@@ -1,16 +1,101 @@
 # consulta_client.py
+import asyncio
 import logging
 import os
 import time
 from datetime import datetime
-from dataclasses import dataclass, field
-from typing import Optional, Any, List, Dict
+from io import BytesIO
+from xml.sax.saxutils import escape
+from dataclasses import dataclass, field, replace
+from typing import Optional, Any, List, Dict, Tuple
 
-import requests
+import httpx
+from cachetools import TTLCache
 from lxml import etree
 
 logger = logging.getLogger(__name__)
 
+# --- Expresiones XPath precompiladas para el parseo de respuestas de la BDA ---
+# Namespace del servicio (elementFormDefault="qualified" en consultaDBA.wsdl).
+BDA_NS = "http://service.consultabda.srtm.iecisa.co"
+_CONSULTA_OPERATIONS = ('consultaBDAPositiva', 'consultaBDANegativa', 'consultaBDANegativaTipoReporte')
+# Tag calificado del elemento <op>Return que se busca al parsear la respuesta en streaming.
+_RETURN_TAGS = {op: f"{{{BDA_NS}}}{op}Return" for op in _CONSULTA_OPERATIONS}
+# Opciones de parser: sin diccionario de IDs ni resolución de entidades.
+_PARSER_OPTIONS = dict(collect_ids=False, resolve_entities=False, remove_blank_text=True, huge_tree=False)
+# El XML interno de la BDA (ConsultaBDA/RespuestaConsultaBDA) no declara namespace.
+_XP = {
+    name: etree.XPath(f"{name}/text()", smart_strings=False)
+    for name in ('CodigoError', 'DescripcionError', 'Imei', 'Tecnologia', 'FechaReporte')
+}
+# Nodos del XML interno que se extraen durante el iterparse.
+_INNER_TAGS = ('TipoRespuesta', 'RespuestaConsultaBDAError', 'RegistroBDANegativa', 'RegistroBDAPositiva')
+
+# Reintentos acotados ante 5xx transitorios (las consultas son de solo lectura).
+_RETRY_STATUS = frozenset({502, 503, 504})
+_MAX_RETRIES = 2
+_RETRY_BACKOFF = 0.2
+
+# Caché de respuestas exitosas por operación: TTL en segundos (la BDA Negativa cambia con más frecuencia).
+CACHE_MAXSIZE = 10_000
+CACHE_TTL = {
+    'consultaBDAPositiva': 300,
+    'consultaBDANegativa': 60,
+    'consultaBDANegativaTipoReporte': 60,
+}
+
+def _text(values: list, default: str) -> str:
+    """Retorna el primer valor de una XPath `.../text()` o el valor por defecto."""
+    return values[0] if values else default
+
+def _format_fecha_reporte(raw: Optional[str]) -> str:
+    """Convierte 'YYYYMMDDHHMMSS' a 'YYYY-MM-DD HH:MM:SS' por slicing; 'N/A' si no tiene ese formato."""
+    if not raw or len(raw) != 14 or not raw.isdigit():
+        return 'N/A'
+    return f"{raw[0:4]}-{raw[4:6]}-{raw[6:8]} {raw[8:10]}:{raw[10:12]}:{raw[12:14]}"
+
+def _inner_events(result_element: etree._Element):
+    """
+    Eventos 'end' del XML interno de la BDA, filtrados a `_INNER_TAGS`, y si es un árbol propio.
+
+    Si el servicio entrega el XML interno como elementos anidados se recorre el árbol ya
+    parseado (iterwalk); si lo entrega como texto (CDATA/escapado) se parsea en streaming.
+    Solo el árbol del streaming es propio y se puede ir liberando: el de iterwalk es
+    `result_element`, que se sigue usando después (p. ej. para el log de estructura desconocida).
+    """
+    if len(result_element):
+        return etree.iterwalk(result_element, events=('end',), tag=_INNER_TAGS), False
+    return etree.iterparse(BytesIO(result_element.text.encode('utf-8')), events=('end',), tag=_INNER_TAGS, **_PARSER_OPTIONS), True
+
+def _parse_inner(events, liberar: bool) -> Dict[str, Any]:
+    """
+    Extrae en una sola pasada los campos relevantes del XML interno de la BDA.
+
+    Retorna un dict con 'tipo' ('error', 'negativa', 'positiva' o None) y los campos del
+    nodo encontrado. Un nodo de error tiene prioridad y detiene el recorrido; un registro
+    negativo tiene prioridad sobre uno positivo. Con `liberar`, cada nodo se vacía tras leerlo.
+    """
+    result: Dict[str, Any] = {'tipo': None}
+    for _, elem in events:
+        tag = elem.tag
+        if tag == 'TipoRespuesta':
+            result.setdefault('TipoRespuesta', elem.text or '')
+        elif tag == 'RespuestaConsultaBDAError':
+            result['tipo'] = 'error'
+            result['CodigoError'] = _text(_XP['CodigoError'](elem), 'N/A')
+            result['DescripcionError'] = _text(_XP['DescripcionError'](elem), 'Error desconocido')
+            break
+        elif tag == 'RegistroBDANegativa':
+            if result['tipo'] != 'negativa':
+                result['tipo'] = 'negativa'
+                for name in ('Imei', 'Tecnologia', 'FechaReporte'):
+                    result[name] = _text(_XP[name](elem), None)
+        elif result['tipo'] is None:
+            result['tipo'] = 'positiva'
+        if liberar:
+            elem.clear(keep_tail=True)
+    return result
+
 @dataclass
 class ConsultaDBAResponse:
     success: bool = False
@@ -28,94 +113,144 @@ class ConsultaDBAClient:
         self.endpoint = endpoint
         self.user_id = user_id
         self.password = password
-        self.session = requests.Session()
-        logger.info("🔧 Cliente ConsultaBDA (Modo Manual) inicializado.")
-
-    def _build_negativa_query_xml(self, imei: str) -> str:
-        """Construye el XML para consultas a la BDA Negativa."""
-        return (
-            '<![CDATA[<?xml version="1.0" encoding="UTF-8"?>'
-            '<ConsultaBDA xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">'
-            '<CuerpoConsulta><Consulta>'
-            '<TipoConsulta>1</TipoConsulta>'
-            f'<DatoConsulta>{imei}</DatoConsulta>'
-            '</Consulta></CuerpoConsulta></ConsultaBDA>]]>'
+        # Cliente HTTP asíncrono con pool keep-alive compartido por todas las consultas concurrentes.
+        # El transporte reintenta los fallos de conexión; los 5xx transitorios se reintentan en `_fetch_return_element`.
+        self._client = httpx.AsyncClient(
+            transport=httpx.AsyncHTTPTransport(
+                http2=True,
+                limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+                retries=_MAX_RETRIES,
+            ),
+            timeout=30,
+            headers={'Content-Type': 'text/xml;charset=UTF-8', 'SOAPAction': '""'},
         )
+        # Caché TTL por operación, indexada por el XML de consulta (imei, tipo_id, id_prop).
+        # Solo se accede desde el event loop, por lo que no requiere lock.
+        self._cache = {op: TTLCache(maxsize=CACHE_MAXSIZE, ttl=CACHE_TTL[op]) for op in _CONSULTA_OPERATIONS}
+        # Sobres SOAP pre-renderizados por operación: (prefijo, sufijo) alrededor del XML de consulta.
+        self._envelopes = {op: self._build_envelope(op) for op in _CONSULTA_OPERATIONS}
+        logger.info("🔧 Cliente ConsultaBDA (Modo Manual) inicializado.")
 
-    def _build_positiva_query_xml(self, imei: str, tipo_id: str, id_prop: str) -> str:
-        """Construye el XML para la consulta a la BDA Positiva."""
-        return (
-            '<![CDATA[<?xml version="1.0" encoding="UTF-8"?>'
-            '<ConsultaBDA xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">'
-            '<CuerpoConsulta><ConsultaPositiva>'
-            f'<Imei>{imei}</Imei>'
-            f'<TipoIdentificacionPropietario>{tipo_id}</TipoIdentificacionPropietario>'
-            f'<IdentificacionPropietario>{id_prop}</IdentificacionPropietario>'
-            '</ConsultaPositiva></CuerpoConsulta></ConsultaBDA>]]>'
-        )
+    async def aclose(self) -> None:
+        """Cierra el pool de conexiones del cliente HTTP."""
+        await self._client.aclose()
 
-    def _send_request(self, query_operation_name: str, xml_payload: str) -> ConsultaDBAResponse:
-        transaction_time = datetime.utcnow()
-        response = ConsultaDBAResponse(timestamp=transaction_time)
-        start_time = time.time()
-
-        soap_envelope = f"""<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" xmlns:ser="http://service.consultabda.srtm.iecisa.co">
+    def _build_envelope(self, operation: str) -> Tuple[bytes, bytes]:
+        """Construye una sola vez las partes estáticas del sobre SOAP (credenciales XML-escapadas) para una operación."""
+        prefix = f"""<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" xmlns:ser="{BDA_NS}">
    <soapenv:Header/>
    <soapenv:Body>
-      <ser:{query_operation_name}>
-         <ser:usuario>{self.user_id}</ser:usuario>
-         <ser:password>{self.password}</ser:password>
-         <ser:xml>{xml_payload}</ser:xml>
-      </ser:{query_operation_name}>
+      <ser:{operation}>
+         <ser:usuario>{escape(self.user_id)}</ser:usuario>
+         <ser:password>{escape(self.password)}</ser:password>
+         <ser:xml>"""
+        suffix = f"""</ser:xml>
+      </ser:{operation}>
    </soapenv:Body>
 </soapenv:Envelope>"""
+        return prefix.encode('utf-8'), suffix.encode('utf-8')
+
+    def _build_negativa_query_xml(self, imei: str) -> bytes:
+        """Construye el XML (UTF-8) para consultas a la BDA Negativa."""
+        return b''.join((
+            b'<![CDATA[<?xml version="1.0" encoding="UTF-8"?>'
+            b'<ConsultaBDA xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">'
+            b'<CuerpoConsulta><Consulta>'
+            b'<TipoConsulta>1</TipoConsulta>'
+            b'<DatoConsulta>', imei.encode('utf-8'), b'</DatoConsulta>'
+            b'</Consulta></CuerpoConsulta></ConsultaBDA>]]>',
+        ))
+
+    def _build_positiva_query_xml(self, imei: str, tipo_id: str, id_prop: str) -> bytes:
+        """Construye el XML (UTF-8) para la consulta a la BDA Positiva."""
+        return b''.join((
+            b'<![CDATA[<?xml version="1.0" encoding="UTF-8"?>'
+            b'<ConsultaBDA xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">'
+            b'<CuerpoConsulta><ConsultaPositiva>'
+            b'<Imei>', imei.encode('utf-8'), b'</Imei>'
+            b'<TipoIdentificacionPropietario>', tipo_id.encode('utf-8'), b'</TipoIdentificacionPropietario>'
+            b'<IdentificacionPropietario>', id_prop.encode('utf-8'), b'</IdentificacionPropietario>'
+            b'</ConsultaPositiva></CuerpoConsulta></ConsultaBDA>]]>',
+        ))
+
+    async def _fetch_return_element(self, query_operation_name: str, body: bytes, response: ConsultaDBAResponse) -> Optional[etree._Element]:
+        """
+        Envía el sobre SOAP y parsea la respuesta en streaming hasta cerrar el elemento <op>Return.
+
+        El parseo se solapa con la recepción del cuerpo y se detiene al encontrar el elemento;
+        el resto del cuerpo se descarta sin parsear para devolver la conexión al pool.
+        Reintenta ante 5xx transitorios con backoff exponencial.
+        """
+        debug = logger.isEnabledFor(logging.DEBUG)
+        for attempt in range(_MAX_RETRIES + 1):
+            async with self._client.stream('POST', self.endpoint, content=body) as http_res:
+                response.http_status = http_res.status_code
+                if http_res.status_code not in _RETRY_STATUS or attempt == _MAX_RETRIES:
+                    http_res.raise_for_status()
+                    parser = etree.XMLPullParser(events=('end',), tag=_RETURN_TAGS[query_operation_name], **_PARSER_OPTIONS)
+                    result_element = None
+                    raw = bytearray() if debug else None
+                    async for chunk in http_res.aiter_bytes():
+                        if debug and len(raw) < 4096:
+                            raw += chunk
+                        if result_element is None:
+                            parser.feed(chunk)
+                            for _, result_element in parser.read_events():
+                                break
+                    if debug:
+                        logger.debug("Respuesta SOAP cruda del servicio:\n%s", raw[:4096].decode('utf-8', 'replace'))
+                    if result_element is None:
+                        # Valida el documento completo (lanza XMLSyntaxError si está truncado o mal formado).
+                        parser.close()
+                    return result_element
+            await asyncio.sleep(_RETRY_BACKOFF * (2 ** attempt))
+
+    async def _send_request(self, query_operation_name: str, xml_payload: bytes, use_cache: bool = True) -> ConsultaDBAResponse:
+        transaction_time = datetime.utcnow()
+        start_time = time.time()
+        cache = self._cache[query_operation_name]
+        if use_cache:
+            cached = cache.get(xml_payload)
+            if cached is not None:
+                logger.debug("--- CONSULTA (%s) servida desde caché ---", query_operation_name)
+                return replace(cached, timestamp=transaction_time, response_time_ms=(time.time() - start_time) * 1000)
 
-        headers = {'Content-Type': 'text/xml;charset=UTF-8', 'SOAPAction': '""'}
-        logger.info(f"--- INICIO CONSULTA ({query_operation_name}) ---")
+        response = ConsultaDBAResponse(timestamp=transaction_time)
+
+        prefix, suffix = self._envelopes[query_operation_name]
+        body = b''.join((prefix, xml_payload, suffix))
+
+        logger.debug("--- INICIO CONSULTA (%s) ---", query_operation_name)
         
         try:
-            http_res = self.session.post(self.endpoint, data=soap_envelope.encode('utf-8'), headers=headers, timeout=30)
-            response.http_status = http_res.status_code
-            logger.info(f"Respuesta SOAP cruda del servicio:\n{http_res.text}")
-            http_res.raise_for_status()
-            
-            root = etree.fromstring(http_res.content)
-            result_element = root.find(f'.//{{*}}{query_operation_name}Return')
-
-            if result_element is not None and result_element.text:
-                inner_xml_root = etree.fromstring(result_element.text.encode('utf-8'))
-                
+            result_element = await self._fetch_return_element(query_operation_name, body, response)
+
+            if result_element is not None and (len(result_element) or result_element.text):
                 # --- LÓGICA DE PARSEO GENERALIZADA ---
-                error_node = inner_xml_root.find('.//{*}RespuestaConsultaBDAError')
-                registro_neg_node = inner_xml_root.find('.//{*}RegistroBDANegativa')
-                # Asumimos una estructura para el registro positivo exitoso
-                registro_pos_node = inner_xml_root.find('.//{*}RegistroBDAPositiva')
+                inner = _parse_inner(*_inner_events(result_element))
                 
-                if error_node is not None:
+                if inner['tipo'] == 'error':
                     # Manejo de respuesta de error
                     response.success = False
-                    codigo_error = error_node.findtext('{*}CodigoError', 'N/A')
-                    desc_error = error_node.findtext('{*}DescripcionError', 'Error desconocido')
+                    codigo_error = inner['CodigoError']
+                    desc_error = inner['DescripcionError']
                     response.message = f"Error de la BDA: {desc_error}"
                     response.error_code = codigo_error
                     response.raw_response = [{"CodigoError": codigo_error, "DescripcionError": desc_error}]
                 
-                elif registro_neg_node is not None:
+                elif inner['tipo'] == 'negativa':
                     # Manejo de respuesta negativa exitosa
-                    fecha_reporte_raw = registro_neg_node.findtext('{*}FechaReporte', '')
-                    dt_obj = datetime.strptime(fecha_reporte_raw, '%Y%m%d%H%M%S') if fecha_reporte_raw else None
-                    
                     response.success = True
                     response.message = "Consulta negativa procesada exitosamente."
                     response.raw_response = [{
-                        "TipoRespuesta": inner_xml_root.findtext('.//{*}TipoRespuesta', 'N/A'),
+                        "TipoRespuesta": inner.get('TipoRespuesta', 'N/A'),
                         "RespuestaConsultaBDANegativa": "Registro Encontrado",
-                        "Imei": registro_neg_node.findtext('{*}Imei', 'N/A'),
-                        "Tecnologia": registro_neg_node.findtext('{*}Tecnologia', 'N/A'),
-                        "FechaReporte": dt_obj.strftime('%Y-%d-%m %H:%M:%S') if dt_obj else 'N/A'
+                        "Imei": inner['Imei'] or 'N/A',
+                        "Tecnologia": inner['Tecnologia'] or 'N/A',
+                        "FechaReporte": _format_fecha_reporte(inner['FechaReporte'])
                     }]
 
-                elif registro_pos_node is not None:
+                elif inner['tipo'] == 'positiva':
                      # TODO: Implementar parseo de consulta positiva exitosa si se conoce la estructura
                      response.success = True
                      response.message = "Consulta positiva procesada exitosamente (Estructura de datos pendiente)."
@@ -124,32 +259,44 @@ class ConsultaDBAClient:
                 else:
                     response.success = False
                     response.message = "La estructura de la respuesta no coincide con los patrones conocidos."
-                    response.raw_response = [{"error": "Estructura de respuesta desconocida", "response_body": result_element.text}]
+                    response_body = etree.tostring(result_element, encoding='unicode') if len(result_element) else result_element.text
+                    response.raw_response = [{"error": "Estructura de respuesta desconocida", "response_body": response_body}]
 
             else:
                 response.success = False
                 response.message = "La consulta no retornó resultados."
                 response.raw_response = [{"error": "Tag de retorno vacío o no encontrado."}]
 
+        except httpx.HTTPError as e:
+            # Fallos de red/timeout o HTTP 4xx/5xx: esperables, se registran sin traceback.
+            logger.warning("Error de comunicación en consulta (%s): %s: %s", query_operation_name, e.__class__.__name__, e)
+            response.message = "Error de comunicación con el servicio de consultas."
+            response.http_status = 500
+        except etree.XMLSyntaxError as e:
+            logger.warning("Respuesta XML inválida en consulta (%s): %s", query_operation_name, e)
+            response.message = "La respuesta del servicio de consultas no es un XML válido."
+            response.http_status = 500
         except Exception as e:
-            logger.error(f"Error inesperado en consulta ({query_operation_name}): {e}", exc_info=True)
+            logger.error("Error inesperado en consulta (%s): %s", query_operation_name, e, exc_info=True)
             response.message = "Error inesperado en el procesamiento."
             response.http_status = 500
         
         finally:
             response.response_time_ms = (time.time() - start_time) * 1000
-            logger.info(f"--- FIN CONSULTA ({query_operation_name}) --- | Éxito: {response.success}")
+            logger.debug("--- FIN CONSULTA (%s) --- | Éxito: %s", query_operation_name, response.success)
 
+        if response.success:
+            cache[xml_payload] = response
         return response
 
-    def consulta_positiva(self, imei: str, tipo_id_propietario: str, id_propietario: str) -> ConsultaDBAResponse:
+    async def consulta_positiva(self, imei: str, tipo_id_propietario: str, id_propietario: str, use_cache: bool = True) -> ConsultaDBAResponse:
         xml_payload = self._build_positiva_query_xml(imei, tipo_id_propietario, id_propietario)
-        return self._send_request('consultaBDAPositiva', xml_payload)
+        return await self._send_request('consultaBDAPositiva', xml_payload, use_cache)
 
-    def consulta_negativa(self, imei: str) -> ConsultaDBAResponse:
+    async def consulta_negativa(self, imei: str, use_cache: bool = True) -> ConsultaDBAResponse:
         xml_payload = self._build_negativa_query_xml(imei)
-        return self._send_request('consultaBDANegativa', xml_payload)
+        return await self._send_request('consultaBDANegativa', xml_payload, use_cache)
         
-    def consulta_negativa_tipo_reporte(self, imei: str) -> ConsultaDBAResponse:
+    async def consulta_negativa_tipo_reporte(self, imei: str, use_cache: bool = True) -> ConsultaDBAResponse:
         xml_payload = self._build_negativa_query_xml(imei) # Reutiliza el XML de consulta negativa
-        return self._send_request('consultaBDANegativaTipoReporte', xml_payload)
\ No newline at end of file
+        return await self._send_request('consultaBDANegativaTipoReporte', xml_payload, use_cache)
\ No newline at end of file
@@ -1,8 +1,11 @@
 # database.py
+import asyncio
 import os
-import json
 from datetime import datetime
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean, Text
+from typing import Optional
+
+import orjson
+from sqlalchemy import create_engine, event, make_url, Column, Integer, String, DateTime, Boolean, Text
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 # Cargar la URL de la base de datos desde el archivo .env
@@ -14,10 +17,28 @@ if db_dir and not os.path.exists(db_dir):
     os.makedirs(db_dir)
 
 # Configuración de SQLAlchemy
+_url = make_url(DATABASE_URL)
+_is_sqlite = _url.get_backend_name() == "sqlite"
+# SQLite en archivo admite un único escritor a la vez: una sola conexión basta para el escritor
+# de transacciones. En memoria se usa SingletonThreadPool, que no acepta estos argumentos.
+_is_sqlite_file = _is_sqlite and _url.database not in (None, "", ":memory:")
 engine = create_engine(
-    DATABASE_URL, connect_args={"check_same_thread": False}
+    DATABASE_URL, connect_args={"check_same_thread": False},
+    **({"pool_size": 1, "max_overflow": 0} if _is_sqlite_file else {})
 )
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+if _is_sqlite:
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragma(dbapi_conn, _):
+        """WAL + synchronous=NORMAL: lectores concurrentes y un fsync menos por commit."""
+        cur = dbapi_conn.cursor()
+        cur.execute("PRAGMA journal_mode=WAL")
+        cur.execute("PRAGMA synchronous=NORMAL")
+        cur.execute("PRAGMA temp_store=MEMORY")
+        cur.execute("PRAGMA mmap_size=268435456")
+        cur.close()
+
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 Base = declarative_base()
 
 # --- Modelo de la Tabla de Transacciones ---
@@ -47,43 +68,112 @@ def create_db_and_tables():
         print(f"ERROR:    No se pudo crear la base de datos. Error: {e}")
 
 
-def log_transaction(db_session, transaction_type: str, msg_type: str, request_data: dict, response_data: dict, timestamp: datetime):
-    """Guarda un registro de una transacción (acción o consulta) en la base de datos."""
+def _transaction_row(transaction_type: str, msg_type: str, request_data: dict, response_data: dict, timestamp: datetime) -> dict:
+    """Convierte los datos de una transacción en las columnas de la tabla `transactions`."""
+    imei = request_data.get("imei", "N/A")
+
+    # --- INICIO DE LA CORRECCIÓN ---
+    # El campo 'raw_response' puede ser una lista o un diccionario.
+    # Debemos convertirlo a un string JSON para guardarlo en la columna de tipo TEXTO.
+    raw_res_data = response_data['raw_response']
+    
+    if isinstance(raw_res_data, (list, dict)):
+        # Si es una lista/diccionario, lo serializamos a un string JSON.
+        raw_response_for_db = orjson.dumps(raw_res_data).decode()
+    else:
+        # Si ya es un string o None, lo dejamos como está.
+        raw_response_for_db = raw_res_data
+    # --- FIN DE LA CORRECCIÓN ---
+
+    return dict(
+        timestamp=timestamp,
+        transaction_type=transaction_type,
+        msg_type=msg_type,
+        imei=imei,
+        request_payload=orjson.dumps(request_data).decode(),
+        success=response_data['success'],
+        http_status=response_data['http_status'],
+        response_message=response_data['message'],
+        error_code=response_data['error_code'],
+        # Usamos la variable convertida a string.
+        raw_response=raw_response_for_db,
+        response_time_ms=int(response_data['response_time_ms'])
+    )
+
+
+# --- Escritura de transacciones en segundo plano ---
+# Los endpoints encolan la transacción y responden de inmediato; un único escritor
+# agrupa hasta LOG_BATCH_SIZE registros por ventana de LOG_BATCH_WINDOW segundos
+# y los persiste con un solo commit, fuera del camino crítico de la respuesta.
+LOG_BATCH_SIZE = 100
+LOG_BATCH_WINDOW = 0.05
+
+_log_queue: Optional[asyncio.Queue] = None
+_writer_task: Optional[asyncio.Task] = None
+
+
+def _write_transactions(batch: list) -> None:
+    """
+    Persiste un lote de transacciones encoladas con un único INSERT multi-fila (SQLAlchemy Core).
+    Si el lote falla se reintenta fila a fila, de modo que solo se pierde la transacción inválida.
+    """
     try:
-        imei = request_data.get("imei", "N/A")
-
-        # --- INICIO DE LA CORRECCIÓN ---
-        # El campo 'raw_response' puede ser una lista o un diccionario.
-        # Debemos convertirlo a un string JSON para guardarlo en la columna de tipo TEXTO.
-        raw_res_data = response_data.get('raw_response')
-        
-        if isinstance(raw_res_data, (list, dict)):
-            # Si es una lista/diccionario, lo serializamos a un string JSON.
-            raw_response_for_db = json.dumps(raw_res_data)
-        else:
-            # Si ya es un string o None, lo dejamos como está.
-            raw_response_for_db = raw_res_data
-        # --- FIN DE LA CORRECCIÓN ---
-
-        transaction_record = Transaction(
-            timestamp=timestamp,
-            transaction_type=transaction_type,
-            msg_type=msg_type,
-            imei=imei,
-            request_payload=json.dumps(request_data),
-            success=response_data.get('success'),
-            http_status=response_data.get('http_status'),
-            response_message=response_data.get('message'),
-            error_code=response_data.get('error_code'),
-            # Usamos la variable convertida a string.
-            raw_response=raw_response_for_db,
-            response_time_ms=int(response_data.get('response_time_ms', 0))
-        )
-        db_session.add(transaction_record)
-        db_session.commit()
-        db_session.refresh(transaction_record)
-        return transaction_record
+        rows = [_transaction_row(*item) for item in batch]
+        with engine.begin() as conn:
+            conn.execute(Transaction.__table__.insert(), rows)
+        return
     except Exception as e:
-        print(f"ERROR:    Fallo al guardar la transacción en la BD: {e}")
-        db_session.rollback()
-        return None
\ No newline at end of file
+        if len(batch) == 1:
+            print(f"ERROR:    Fallo al guardar la transacción en la BD: {e}")
+            return
+        print(f"ERROR:    Fallo al guardar {len(batch)} transacciones en la BD, se reintenta una a una: {e}")
+
+    for item in batch:
+        _write_transactions([item])
+
+
+async def _drain_log_queue():
+    """Consume la cola de transacciones hasta recibir el marcador de parada (None)."""
+    while True:
+        batch = [await _log_queue.get()]
+        await asyncio.sleep(LOG_BATCH_WINDOW)
+        while len(batch) < LOG_BATCH_SIZE and not _log_queue.empty():
+            batch.append(_log_queue.get_nowait())
+
+        stop = None in batch
+        batch = [item for item in batch if item is not None]
+        if batch:
+            await asyncio.to_thread(_write_transactions, batch)
+        if stop:
+            return
+
+
+def start_transaction_writer():
+    """Crea la cola de transacciones y lanza el escritor en segundo plano."""
+    global _log_queue, _writer_task
+    _log_queue = asyncio.Queue()
+    _writer_task = asyncio.create_task(_drain_log_queue())
+
+
+async def stop_transaction_writer():
+    """Detiene el escritor después de persistir las transacciones pendientes."""
+    global _log_queue, _writer_task
+    if _writer_task is None:
+        return
+    _log_queue.put_nowait(None)
+    await _writer_task
+    # Sin escritor, `queue_transaction` vuelve a guardar de forma síncrona
+    _log_queue = None
+    _writer_task = None
+
+
+def queue_transaction(transaction_type: str, msg_type: str, request_data: dict, response_data: dict, timestamp: datetime):
+    """
+    Encola una transacción (acción o consulta) para que el escritor la guarde en la BD.
+    Si el escritor no está en marcha (uso fuera del arranque de FastAPI) se guarda de forma síncrona.
+    """
+    item = (transaction_type, msg_type, request_data, response_data, timestamp)
+    if _log_queue is None:
+        _write_transactions([item])
+        return
+    _log_queue.put_nowait(item)
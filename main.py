@@ -1,26 +1,32 @@
 # main.py
 import uvicorn
 import os
+import msgspec
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, status, Depends, Path
+from fastapi import FastAPI, HTTPException, status, Path, Query
 from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import ValidationError
-from sqlalchemy.orm import Session
-from dataclasses import asdict
 
 load_dotenv()
 
 from models import (
     RegistroPositivoRequest, RegistroNegativoRequest, CancelacionNegativoRequest,
-    ModificacionPositivoRequest, CancelacionPositivoRequest, APIResponse,
-    ConsultaNegativaRequest, ConsultaPositivaRequest
+    ModificacionPositivoRequest, CancelacionPositivoRequest, APIResponse, APIResponseStruct,
+    ConsultaNegativaRequest, ConsultaPositivaRequest, format_transaction_timestamp
 )
-from soap_client import SRTMAxisClient, SRTMResponse, logger
+from soap_client import SRTMAxisClientAsync, SRTMResponse, logger
 from consulta_client import ConsultaDBAClient, ConsultaDBAResponse
 import database
 
+_msgspec_encoder = msgspec.json.Encoder()
+
+class MsgspecJSONResponse(JSONResponse):
+    """Respuesta JSON serializada con msgspec (`APIResponseStruct` y los manejadores de error)."""
+    def render(self, content) -> bytes:
+        return _msgspec_encoder.encode(content)
+
 app = FastAPI(
     title="SRTM Wrapper API v1.5",
     description="API REST para interactuar con los servicios SOAP SRTM de acciones y consultas, con errores de validación descriptivos.",
@@ -61,15 +67,30 @@ app.add_middleware(
     max_age=86400,  # 24 horas
 )
 
+# Tipos de mensaje SRTM por acción, resueltos una sola vez en el arranque.
+MSG_TYPE_ENV_VARS = {
+    'registro_positivo': "MSG_TYPE_REGISTRO_POSITIVO",
+    'registro_negativo': "MSG_TYPE_REGISTRO_NEGATIVO",
+    'cancelacion_negativo': "MSG_TYPE_CANCELACION_NEGATIVO",
+    'modificacion_positivo': "MSG_TYPE_MODIFICACION_POSITIVO",
+    'cancelacion_positivo': "MSG_TYPE_CANCELACION_POSITIVO",
+}
+MSG_TYPES = {}
+
 @app.on_event("startup")
-def on_startup():
-    global soap_client, consulta_client
+async def on_startup():
+    global soap_client, consulta_client, MSG_TYPES
     database.create_db_and_tables()
+    database.start_transaction_writer()
     
     logger.info("🚀 Iniciando SRTM API...")
     
+    MSG_TYPES = {action: os.getenv(env_var) for action, env_var in MSG_TYPE_ENV_VARS.items()}
     try:
-        soap_client = SRTMAxisClient(
+        missing = [MSG_TYPE_ENV_VARS[action] for action, msg_type in MSG_TYPES.items() if not msg_type]
+        if missing:
+            raise ValueError(f"Faltan variables de entorno de tipo de mensaje: {', '.join(missing)}")
+        soap_client = SRTMAxisClientAsync(
             endpoint=os.getenv("SRTM_ENDPOINT"),
             user_id=os.getenv("SRTM_USER"),
             password=os.getenv("SRTM_PASSWORD")
@@ -92,7 +113,16 @@ def on_startup():
     
     logger.info("🎯 SRTM API lista para recibir requests")
 
+@app.on_event("shutdown")
+async def on_shutdown():
+    await database.stop_transaction_writer()
+    if soap_client:
+        await soap_client.aclose()
+    if consulta_client:
+        await consulta_client.aclose()
+
 def get_db():
+    """Sesión de BD para futuros endpoints de lectura; los endpoints actuales registran vía `queue_transaction`."""
     db = database.SessionLocal()
     try:
         yield db
@@ -132,11 +162,15 @@ async def validation_exception_handler(request, exc: RequestValidationError):
         field_name = str(error['loc'][-1])
         # error['msg'] contiene la razón del error, ej: "Field required"
         message = error['msg']
+        # Los campos obligatorios los valida pydantic-core; conservamos el mensaje en español.
+        # Un null explícito cuenta como ausente, sea cual sea el tipo del campo (str, Literal...).
+        if error['type'] == 'missing' or ('input' in error and error['input'] is None):
+            message = "Este campo es obligatorio."
         
         # Creamos un mensaje de error claro y específico
         formatted_errors.append(f"Campo '{field_name}': {message}")
         
-    return JSONResponse(
+    return MsgspecJSONResponse(
         status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
         content={
             "detail": "Error de validación en la solicitud. Uno o más campos son inválidos o están ausentes.",
@@ -150,7 +184,7 @@ async def validation_exception_handler(request, exc: RequestValidationError):
 @app.exception_handler(Exception)
 async def generic_exception_handler(request, exc):
     logger.error(f"Error no controlado en {request.url.path}: {exc}", exc_info=True)
-    return JSONResponse(
+    return MsgspecJSONResponse(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, 
         content={
             "detail": f"Ocurrió un error interno en el servidor: {str(exc)}",
@@ -160,44 +194,58 @@ async def generic_exception_handler(request, exc):
         }
     )
 
+def _response_dict(soap_response) -> dict:
+    """Campos de la respuesta SOAP que se registran en la BD, sin la copia profunda de `asdict`."""
+    return {
+        'success': soap_response.success,
+        'http_status': soap_response.http_status,
+        'message': soap_response.message,
+        'error_code': soap_response.error_code,
+        'raw_response': soap_response.raw_response,
+        'response_time_ms': soap_response.response_time_ms,
+    }
+
 def create_api_response(soap_response):
     if not soap_response.success and soap_response.http_status >= 500:
         raise HTTPException(status_code=soap_response.http_status, detail=soap_response.message)
-    return APIResponse(
+    # Los datos provienen de nuestros propios clientes SOAP (tipos ya conocidos): se arma un
+    # Struct de msgspec y se devuelve ya serializado, sin pasar por la validación de pydantic.
+    # Al devolver un Response, FastAPI no re-procesa el `response_model` (que solo documenta).
+    return MsgspecJSONResponse(APIResponseStruct(
         success=soap_response.success,
         http_status=soap_response.http_status,
         message=soap_response.message,
         error_code=soap_response.error_code,
         raw_response=soap_response.raw_response,
-        transaction_timestamp=soap_response.timestamp.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
-    )
+        transaction_timestamp=format_transaction_timestamp(soap_response.timestamp)
+    ))
 
 # ========================================
 # ENDPOINTS DE ACCIONES SRTM
 # ========================================
 
 @app.post("/registro-positivo", response_model=APIResponse, summary="1001: Registrar un IMEI en la lista positiva", tags=["Acciones SRTM"])
-async def registro_positivo(request: RegistroPositivoRequest, db: Session = Depends(get_db)):
+async def registro_positivo(request: RegistroPositivoRequest):
     if not soap_client:
         raise HTTPException(status_code=503, detail="Servicio no disponible: Cliente SOAP de acciones no inicializado.")
     
     logger.info(f"📝 Procesando registro positivo para IMEI: {request.imei}")
-    soap_response = soap_client.registrar_positivo(request)
-    database.log_transaction(db, 'action', os.getenv("MSG_TYPE_REGISTRO_POSITIVO"), request.model_dump(), asdict(soap_response), soap_response.timestamp)
+    soap_response = await soap_client.registrar_positivo_async(request)
+    database.queue_transaction('action', MSG_TYPES['registro_positivo'], request.model_dump(), _response_dict(soap_response), soap_response.timestamp)
     return create_api_response(soap_response)
     
 @app.post("/registro-negativo", response_model=APIResponse, summary="2001: Reportar un IMEI por robo o pérdida", tags=["Acciones SRTM"])
-async def registro_negativo(request: RegistroNegativoRequest, db: Session = Depends(get_db)):
+async def registro_negativo(request: RegistroNegativoRequest):
     if not soap_client:
         raise HTTPException(status_code=503, detail="Servicio no disponible: Cliente SOAP de acciones no inicializado.")
     
     logger.info(f"🚨 Procesando registro negativo para IMEI: {request.imei}")
-    soap_response = soap_client.registrar_negativo(request)
-    database.log_transaction(db, 'action', os.getenv("MSG_TYPE_REGISTRO_NEGATIVO"), request.model_dump(), asdict(soap_response), soap_response.timestamp)
+    soap_response = await soap_client.registrar_negativo_async(request)
+    database.queue_transaction('action', MSG_TYPES['registro_negativo'], request.model_dump(), _response_dict(soap_response), soap_response.timestamp)
     return create_api_response(soap_response)
 
 @app.post("/cancelacion-negativo", response_model=APIResponse, summary="3001: Cancelar un reporte de robo/pérdida", tags=["Acciones SRTM"])
-async def cancelacion_negativo(request: CancelacionNegativoRequest, db: Session = Depends(get_db)):
+async def cancelacion_negativo(request: CancelacionNegativoRequest):
     """
     Cancela un registro negativo existente en la BDA.
     
@@ -209,7 +257,7 @@ async def cancelacion_negativo(request: CancelacionNegativoRequest, db: Session
     **Ejemplo de request:**
     ```json
     {
-        "imei": "8577055059447491",
+        "imei": "857055059447491",
         "fecha_reporte": "20241025143000",
         "observaciones": "Cancelacion de reporte por recuperacion del equipo."
     }
@@ -219,72 +267,75 @@ async def cancelacion_negativo(request: CancelacionNegativoRequest, db: Session
         raise HTTPException(status_code=503, detail="Servicio no disponible: Cliente SOAP de acciones no inicializado.")
     
     logger.info(f"✅ Procesando cancelación negativo para IMEI: {request.imei}, Fecha: {request.fecha_reporte}")
-    soap_response = soap_client.cancelar_negativo(request)
-    database.log_transaction(db, 'action', os.getenv("MSG_TYPE_CANCELACION_NEGATIVO"), request.model_dump(), asdict(soap_response), soap_response.timestamp)
+    soap_response = await soap_client.cancelar_negativo_async(request)
+    database.queue_transaction('action', MSG_TYPES['cancelacion_negativo'], request.model_dump(), _response_dict(soap_response), soap_response.timestamp)
     return create_api_response(soap_response)
 
 
 @app.post("/modificacion-positivo", response_model=APIResponse, summary="4001: Modificar un registro positivo existente", tags=["Acciones SRTM"])
-async def modificacion_positivo(request: ModificacionPositivoRequest, db: Session = Depends(get_db)):
+async def modificacion_positivo(request: ModificacionPositivoRequest):
     if not soap_client:
         raise HTTPException(status_code=503, detail="Servicio no disponible: Cliente SOAP de acciones no inicializado.")
     
     logger.info(f"🔄 Procesando modificación positivo para IMEI: {request.imei}")
-    soap_response = soap_client.modificar_positivo(request)
-    database.log_transaction(db, 'action', os.getenv("MSG_TYPE_MODIFICACION_POSITIVO"), request.model_dump(), asdict(soap_response), soap_response.timestamp)
+    soap_response = await soap_client.modificar_positivo_async(request)
+    database.queue_transaction('action', MSG_TYPES['modificacion_positivo'], request.model_dump(), _response_dict(soap_response), soap_response.timestamp)
     return create_api_response(soap_response)
 
 @app.post("/cancelacion-positivo", response_model=APIResponse, summary="5001: Cancelar un registro de la lista positiva", tags=["Acciones SRTM"])
-async def cancelacion_positivo(request: CancelacionPositivoRequest, db: Session = Depends(get_db)):
+async def cancelacion_positivo(request: CancelacionPositivoRequest):
     if not soap_client:
         raise HTTPException(status_code=503, detail="Servicio no disponible: Cliente SOAP de acciones no inicializado.")
     
     logger.info(f"❌ Procesando cancelación positivo para IMEI: {request.imei}")
-    soap_response = soap_client.cancelar_positivo(request)
-    database.log_transaction(db, 'action', os.getenv("MSG_TYPE_CANCELACION_POSITIVO"), request.model_dump(), asdict(soap_response), soap_response.timestamp)
+    soap_response = await soap_client.cancelar_positivo_async(request)
+    database.queue_transaction('action', MSG_TYPES['cancelacion_positivo'], request.model_dump(), _response_dict(soap_response), soap_response.timestamp)
     return create_api_response(soap_response)
 
 # ========================================
 # ENDPOINTS DE CONSULTAS BDA
 # ========================================
+
+NO_CACHE_QUERY = Query(False, description="Si es true, ignora la caché y consulta directamente la BDA.")
     
 @app.post("/consulta/positiva", response_model=APIResponse, summary="Consultar IMEI en BDA Positiva", tags=["Consultas BDA"])
-async def consulta_positiva(request: ConsultaPositivaRequest, db: Session = Depends(get_db)):
+async def consulta_positiva(request: ConsultaPositivaRequest, no_cache: bool = NO_CACHE_QUERY):
     if not consulta_client:
         raise HTTPException(status_code=503, detail="Servicio no disponible: Cliente SOAP de consultas no inicializado.")
     
     logger.info(f"🔍 Procesando consulta positiva para IMEI: {request.imei}")
-    soap_response = consulta_client.consulta_positiva(
+    soap_response = await consulta_client.consulta_positiva(
         imei=request.imei,
         tipo_id_propietario=request.tipo_identificacion_propietario,
-        id_propietario=request.identificacion_propietario
+        id_propietario=request.identificacion_propietario,
+        use_cache=not no_cache
     )
     
-    database.log_transaction(db, 'query', 'consultaBDAPositiva', request.model_dump(), asdict(soap_response), soap_response.timestamp)
+    database.queue_transaction('query', 'consultaBDAPositiva', request.model_dump(), _response_dict(soap_response), soap_response.timestamp)
     return create_api_response(soap_response)
 
 @app.get("/consulta/negativa/{imei}", response_model=APIResponse, summary="Consultar IMEI en BDA Negativa", tags=["Consultas BDA"])
-async def consulta_negativa(imei: str = Path(..., min_length=15, max_length=15, pattern="^[0-9]*$"), db: Session = Depends(get_db)):
+async def consulta_negativa(imei: str = Path(..., min_length=15, max_length=15, pattern="^[0-9]*$"), no_cache: bool = NO_CACHE_QUERY):
     if not consulta_client:
         raise HTTPException(status_code=503, detail="Servicio no disponible: Cliente SOAP de consultas no inicializado.")
     
     logger.info(f"🔍 Procesando consulta negativa para IMEI: {imei}")
     request_model = ConsultaNegativaRequest(imei=imei)
-    soap_response = consulta_client.consulta_negativa(imei)
+    soap_response = await consulta_client.consulta_negativa(imei, use_cache=not no_cache)
     
-    database.log_transaction(db, 'query', 'consultaBDANegativa', request_model.model_dump(), asdict(soap_response), soap_response.timestamp)
+    database.queue_transaction('query', 'consultaBDANegativa', request_model.model_dump(), _response_dict(soap_response), soap_response.timestamp)
     return create_api_response(soap_response)
     
 @app.get("/consulta/negativa/tipo-reporte/{imei}", response_model=APIResponse, summary="Consultar tipo de reporte de un IMEI en BDA Negativa", tags=["Consultas BDA"])
-async def consulta_negativa_tipo_reporte(imei: str = Path(..., min_length=15, max_length=15, pattern="^[0-9]*$"), db: Session = Depends(get_db)):
+async def consulta_negativa_tipo_reporte(imei: str = Path(..., min_length=15, max_length=15, pattern="^[0-9]*$"), no_cache: bool = NO_CACHE_QUERY):
     if not consulta_client:
         raise HTTPException(status_code=503, detail="Servicio no disponible: Cliente SOAP de consultas no inicializado.")
     
     logger.info(f"🔍 Procesando consulta tipo reporte para IMEI: {imei}")
     request_model = ConsultaNegativaRequest(imei=imei)
-    soap_response = consulta_client.consulta_negativa_tipo_reporte(imei)
+    soap_response = await consulta_client.consulta_negativa_tipo_reporte(imei, use_cache=not no_cache)
     
-    database.log_transaction(db, 'query', 'consultaBDANegativaTipoReporte', request_model.model_dump(), asdict(soap_response), soap_response.timestamp)
+    database.queue_transaction('query', 'consultaBDANegativaTipoReporte', request_model.model_dump(), _response_dict(soap_response), soap_response.timestamp)
     return create_api_response(soap_response)
 
 # ========================================
@@ -1,132 +1,167 @@
 # models.py
 from datetime import datetime
-from typing import Optional, Any, List, Dict
-from pydantic import BaseModel, Field, model_validator
-import re
+from functools import lru_cache
+import msgspec
+from typing import Annotated, Literal, Optional, Any
+from typing_extensions import Self
+from pydantic import BaseModel, ConfigDict, Field, StringConstraints, model_validator
+
+# Configuración común de los modelos de solicitud: se descartan campos extra y las
+# instancias son inmutables (nadie las modifica después de validarlas).
+_REQUEST_CONFIG = ConfigDict(extra='ignore', frozen=True)
+# Para los modelos de uso poco frecuente (cancelaciones) el esquema se construye
+# en la primera validación en lugar de al importar el módulo.
+_DEFERRED_REQUEST_CONFIG = ConfigDict(extra='ignore', frozen=True, defer_build=True)
+
+# Referencia directa a strptime para la validación de fecha_reporte (evita el lookup del atributo).
+_strptime = datetime.strptime
+
+# Tipo reutilizable para el IMEI (15 caracteres): pydantic comparte el mismo esquema
+# entre todos los modelos que lo usan.
+Imei = Annotated[str, StringConstraints(min_length=15, max_length=15)]
+
+# Dominios cerrados de los campos tipo "código": pydantic-core valida la pertenencia
+# directamente (mismos valores que ofrece la UI).
+TipoUsuarioPropietario = Literal['1', '2']
+TipoUsuarioAutorizado = Literal['0', '1', '2']
+TipoReporte = Literal['1', '2', '3', '4', '5', '6', '7', '8', '9']
+TipoModificacion = Literal['1', '2', '3']
+SiNo = Literal['0', '1']
+UtilizacionArmas = Literal['0', '1', '2']
+
+
+@lru_cache(maxsize=None)
+def _mensaje_faltantes(faltantes: tuple, condicion: str) -> str:
+    """
+    Arma un único mensaje con todos los campos condicionales que faltan.
+    Las combinaciones posibles son pocas, así que cada mensaje se formatea una sola vez
+    y las siguientes veces se sirve desde la caché.
+    """
+    if len(faltantes) == 1:
+        return f"El campo '{faltantes[0]}' es obligatorio cuando {condicion}."
+    campos = ", ".join(f"'{field}'" for field in faltantes)
+    return f"Los campos {campos} son obligatorios cuando {condicion}."
+
+
+def _check_conditional(modelo: BaseModel, reglas) -> None:
+    """
+    Valida las reglas condicionales activas de un modelo. Cada regla es una tupla
+    (campos, condición); se acumulan todos los campos faltantes y se lanza un único ValueError.
+    """
+    errores = []
+    for fields, condicion in reglas:
+        faltantes = tuple(field for field in fields if getattr(modelo, field) is None)
+        if faltantes:
+            errores.append(_mensaje_faltantes(faltantes, condicion))
+    if errores:
+        raise ValueError(" ".join(errores))
+
+
+# Reglas condicionales de RegistroNegativoRequest (robo).
+_REG_NEG_REGLA_ROBO = (('empleo_violencia',), "'tipo_reporte' es '1' (Robo)")
+_REG_NEG_REGLA_VIOLENCIA = (('utilizacion_armas', 'victima_menor_edad'), "'empleo_violencia' es '1'")
+
+# Reglas condicionales de ModificacionPositivoRequest (constantes de módulo para no
+# reconstruir las listas en cada validación).
+_MOD_POS_ANTERIOR_TIPOS = frozenset({'2', '3'})
+_MOD_POS_REGLA_ANTERIOR = (
+    ('tipo_identificacion_propietario_anterior', 'identificacion_propietario_anterior'),
+    "'tipo_modificacion' es '2' o '3'"
+)
+_MOD_POS_REGLA_AUTORIZADO = (
+    ('tipo_identificacion_autorizado', 'identificacion_autorizado', 'nombre_razon_social_autorizado',
+     'direccion_autorizado', 'telefono_contacto_autorizado'),
+    "'tipo_usuario_autorizado' no es '0'"
+)
 
 # --- Modelos de Solicitud de Acciones (SIN CAMBIOS) ---
 # ... (todos los modelos de Registro, Cancelacion, etc. permanecen aquí sin cambios)
 class RegistroPositivoRequest(BaseModel):
     """Modelo para la solicitud de registro positivo (1001)."""
-    imei: Optional[str] = Field(None, description="El IMEI del dispositivo a registrar.", example="852055059447491")
-    tipo_usuario_propietario: Optional[str] = Field(None, description="Tipo de usuario propietario. 1: Natural, 2: Jurídico.", example="1")
-    tipo_identificacion_propietario: Optional[str] = Field(None, description="Tipo de identificación. 1: Cédula, 4: CE, etc.", example="1")
-    identificacion_propietario: Optional[str] = Field(None, description="Número de identificación del propietario.", example="22222222222")
-    nombre_razon_social_propietario: Optional[str] = Field(None, description="Nombre completo o razón social del propietario.", example="Fulano de Tal")
-    direccion_propietario: Optional[str] = Field(None, description="Dirección del propietario.", example="kra 1 # 23-45 Bogota Bogota")
-    telefono_contacto_propietario: Optional[str] = Field(None, description="Teléfono de contacto del propietario.", example="3580666666")
-    observaciones: Optional[str] = Field(None, description="Observaciones adicionales.", example="Solicitud de registro inicial de cliente.")
+    model_config = _REQUEST_CONFIG
+
+    imei: Imei = Field(..., description="El IMEI del dispositivo a registrar.", example="852055059447491")
+    tipo_usuario_propietario: TipoUsuarioPropietario = Field(..., description="Tipo de usuario propietario. 1: Natural, 2: Jurídico.", example="1")
+    tipo_identificacion_propietario: str = Field(..., description="Tipo de identificación. 1: Cédula, 4: CE, etc.", example="1")
+    identificacion_propietario: str = Field(..., description="Número de identificación del propietario.", example="22222222222")
+    nombre_razon_social_propietario: str = Field(..., description="Nombre completo o razón social del propietario.", example="Fulano de Tal")
+    direccion_propietario: str = Field(..., description="Dirección del propietario.", example="kra 1 # 23-45 Bogota Bogota")
+    telefono_contacto_propietario: str = Field(..., description="Teléfono de contacto del propietario.", example="3580666666")
+    observaciones: str = Field(..., description="Observaciones adicionales.", example="Solicitud de registro inicial de cliente.")
     imsi: Optional[str] = Field(None, description="IMSI del dispositivo (opcional).", example="732101000000001")
     msisdn: Optional[str] = Field(None, description="Número de línea (opcional).", example="3588777777")
 
-    @model_validator(mode='before')
-    @classmethod
-    def check_required_fields(cls, data: Any) -> Any:
-        """Valida que todos los campos requeridos estén presentes."""
-        if not isinstance(data, dict):
-            return data
-        
-        required_fields = [
-            'imei', 'tipo_usuario_propietario', 'tipo_identificacion_propietario', 
-            'identificacion_propietario', 'nombre_razon_social_propietario', 
-            'direccion_propietario', 'telefono_contacto_propietario', 'observaciones'
-        ]
-        for field in required_fields:
-            if data.get(field) is None:
-                raise ValueError(f"El campo '{field}' es obligatorio.")
-        return data
-
 class RegistroNegativoRequest(BaseModel):
     """Modelo para la solicitud de registro negativo por robo/pérdida (2001)."""
-    imei: Optional[str] = Field(None, description="El IMEI del dispositivo a reportar.", example="852055059447491")
-    tipo_reporte: Optional[str] = Field(None, description="Causa del reporte. '1': Robo, '2': Extravío, etc.", example="1")
-    nombre_reporte: Optional[str] = Field(None, description="Nombre de quien reporta.", example="Fulano de Tal")
-    tipo_identificacion_reporte: Optional[str] = Field(None, description="Tipo de identificación de quien reporta.", example="1")
-    identificacion_reporte: Optional[str] = Field(None, description="Número de identificación de quien reporta.", example="22222222222")
-    telefono_reporte: Optional[str] = Field(None, description="Teléfono de contacto de quien reporta.", example="3585555555")
-    direccion_reporte: Optional[str] = Field(None, description="Dirección de quien reporta.", example="Calle 123 #45-67")
-    ciudad_reporte: Optional[str] = Field(None, description="Ciudad donde ocurrió el incidente.", example="Bogota")
-    departamento_reporte: Optional[str] = Field(None, description="Departamento donde ocurrió el incidente.", example="BOGOTA")
-    correo_electronico: Optional[str] = Field(None, description="Email de contacto.", example="nelsonberm@gmail.com")
-    observaciones: Optional[str] = Field(None, description="Observaciones adicionales.", example="Reporte de robo con violencia.")
-    empleo_violencia: Optional[str] = Field(None, description="¿Se usó violencia? '0': No, '1': Si. Obligatorio si tipo_reporte es '1'.", example="1")
-    utilizacion_armas: Optional[str] = Field(None, description="¿Se usaron armas? '0': Fuego, '1': Blanca, '2': Otras. Obligatorio si tipo_reporte es '1' y empleo_violencia es '1'.", example="1")
-    victima_menor_edad: Optional[str] = Field(None, description="¿La víctima fue menor de edad? '0': No, '1': Si. Obligatorio si tipo_reporte es '1' y empleo_violencia es '1'.", example="0")
-
-    @model_validator(mode='before')
-    @classmethod
-    def check_required_and_robo_fields(cls, data: Any) -> Any:
-        if not isinstance(data, dict):
-            return data
-
-        always_required = [
-            'imei', 'tipo_reporte', 'nombre_reporte', 'tipo_identificacion_reporte', 'identificacion_reporte',
-            'telefono_reporte', 'direccion_reporte', 'ciudad_reporte', 'departamento_reporte', 'correo_electronico', 'observaciones'
-        ]
-        for field in always_required:
-            if data.get(field) is None:
-                raise ValueError(f"El campo '{field}' es obligatorio.")
-
-        if data.get('tipo_reporte') == '1':
-            if data.get('empleo_violencia') is None:
-                raise ValueError("El campo 'empleo_violencia' es obligatorio cuando 'tipo_reporte' es '1' (Robo).")
-            
-            if data.get('empleo_violencia') == '1':
-                if data.get('utilizacion_armas') is None:
-                    raise ValueError("El campo 'utilizacion_armas' es obligatorio cuando 'empleo_violencia' es '1'.")
-                if data.get('victima_menor_edad') is None:
-                    raise ValueError("El campo 'victima_menor_edad' es obligatorio cuando 'empleo_violencia' es '1'.")
+    model_config = _REQUEST_CONFIG
+
+    imei: Imei = Field(..., description="El IMEI del dispositivo a reportar.", example="852055059447491")
+    tipo_reporte: TipoReporte = Field(..., description="Causa del reporte. '1': Robo, '2': Extravío, etc.", example="1")
+    nombre_reporte: str = Field(..., description="Nombre de quien reporta.", example="Fulano de Tal")
+    tipo_identificacion_reporte: str = Field(..., description="Tipo de identificación de quien reporta.", example="1")
+    identificacion_reporte: str = Field(..., description="Número de identificación de quien reporta.", example="22222222222")
+    telefono_reporte: str = Field(..., description="Teléfono de contacto de quien reporta.", example="3585555555")
+    direccion_reporte: str = Field(..., description="Dirección de quien reporta.", example="Calle 123 #45-67")
+    ciudad_reporte: str = Field(..., description="Ciudad donde ocurrió el incidente.", example="Bogota")
+    departamento_reporte: str = Field(..., description="Departamento donde ocurrió el incidente.", example="BOGOTA")
+    correo_electronico: str = Field(..., description="Email de contacto.", example="nelsonberm@gmail.com")
+    observaciones: str = Field(..., description="Observaciones adicionales.", example="Reporte de robo con violencia.")
+    empleo_violencia: Optional[SiNo] = Field(None, description="¿Se usó violencia? '0': No, '1': Si. Obligatorio si tipo_reporte es '1'.", example="1")
+    utilizacion_armas: Optional[UtilizacionArmas] = Field(None, description="¿Se usaron armas? '0': Fuego, '1': Blanca, '2': Otras. Obligatorio si tipo_reporte es '1' y empleo_violencia es '1'.", example="1")
+    victima_menor_edad: Optional[SiNo] = Field(None, description="¿La víctima fue menor de edad? '0': No, '1': Si. Obligatorio si tipo_reporte es '1' y empleo_violencia es '1'.", example="0")
+
+    @model_validator(mode='after')
+    def check_robo_fields(self) -> Self:
+        # Los campos siempre obligatorios los valida pydantic-core; aquí solo las reglas condicionales.
+        if self.tipo_reporte == '1':
+            if self.empleo_violencia is None:
+                _check_conditional(self, (_REG_NEG_REGLA_ROBO,))
+            elif self.empleo_violencia == '1':
+                _check_conditional(self, (_REG_NEG_REGLA_VIOLENCIA,))
         
-        return data
+        return self
 
 class CancelacionNegativoRequest(BaseModel):
     """Modelo para la solicitud de cancelación de un registro negativo (3001)."""
-    imei: Optional[str] = Field(None, description="El IMEI del dispositivo a desbloquear.", example="8577055059447491")
-    fecha_reporte: Optional[str] = Field(
-        None, 
+    model_config = _DEFERRED_REQUEST_CONFIG
+
+    imei: Imei = Field(..., description="El IMEI del dispositivo a desbloquear.", example="857055059447491")
+    fecha_reporte: str = Field(
+        ..., 
         description="Fecha del reporte original en formato YYYYMMDDHHMMSS.", 
         example="20241025143000"
     )
-    observaciones: Optional[str] = Field(None, description="Razón de la cancelación.", example="Cancelacion de reporte por recuperacion del equipo.")
-
-    @model_validator(mode='before')
-    @classmethod
-    def check_required_fields(cls, data: Any) -> Any:
-        if isinstance(data, dict):
-            # Validar campos obligatorios
-            if data.get('imei') is None: 
-                raise ValueError("El campo 'imei' es obligatorio.")
-            if data.get('fecha_reporte') is None: 
-                raise ValueError("El campo 'fecha_reporte' es obligatorio.")
-            if data.get('observaciones') is None: 
-                raise ValueError("El campo 'observaciones' es obligatorio.")
-            
-            # Validar formato de fecha_reporte
-            fecha_reporte = data.get('fecha_reporte')
-            if fecha_reporte:
-                # Validar que tenga exactamente 14 dígitos
-                if not re.match(r'^\d{14}$', fecha_reporte):
-                    raise ValueError("El campo 'fecha_reporte' debe tener el formato YYYYMMDDHHMMSS (14 dígitos).")
-                
-                # Validar que sea una fecha válida
-                try:
-                    datetime.strptime(fecha_reporte, '%Y%m%d%H%M%S')
-                except ValueError:
-                    raise ValueError("El campo 'fecha_reporte' contiene una fecha/hora inválida. Use el formato YYYYMMDDHHMMSS.")
+    observaciones: str = Field(..., description="Razón de la cancelación.", example="Cancelacion de reporte por recuperacion del equipo.")
+
+    @model_validator(mode='after')
+    def check_fecha_reporte(self) -> Self:
+        # Validar formato de fecha_reporte
+        fecha_reporte = self.fecha_reporte
+        # Validar que tenga exactamente 14 dígitos ASCII (isdigit solo acepta también otros dígitos Unicode)
+        if len(fecha_reporte) != 14 or not (fecha_reporte.isascii() and fecha_reporte.isdigit()):
+            raise ValueError("El campo 'fecha_reporte' debe tener el formato YYYYMMDDHHMMSS (14 dígitos).")
+        
+        # Validar que sea una fecha válida
+        try:
+            _strptime(fecha_reporte, '%Y%m%d%H%M%S')
+        except ValueError:
+            raise ValueError("El campo 'fecha_reporte' contiene una fecha/hora inválida. Use el formato YYYYMMDDHHMMSS.")
                 
-        return data
+        return self
 
 class ModificacionPositivoRequest(BaseModel):
     """Modelo para la solicitud de modificación de un registro positivo (4001)."""
-    imei: Optional[str] = Field(None, description="El IMEI del dispositivo a modificar.", example="852055059447491")
-    tipo_modificacion: Optional[str] = Field(None, description="Tipo de modificación a realizar. 1: Venta Inicial, 2: Titularidad, 3: Modificación.", example="2")
-    tipo_usuario_propietario: Optional[str] = Field(None, description="Tipo de usuario del NUEVO propietario.", example="1")
-    tipo_identificacion_propietario: Optional[str] = Field(None, description="Tipo de ID del NUEVO propietario.", example="1")
-    identificacion_propietario: Optional[str] = Field(None, description="Número de ID del NUEVO propietario.", example="222222222222")
-    nombre_razon_social_propietario: Optional[str] = Field(None, description="Nombre del NUEVO propietario.", example="Fulano de Tal (Nuevo Titular)")
-    direccion_propietario: Optional[str] = Field(None, description="Dirección del NUEVO propietario.", example="Calle 123 #45-67")
-    telefono_contacto_propietario: Optional[str] = Field(None, description="Teléfono de contacto del NUEVO propietario.", example="3580666666")
-    tipo_usuario_autorizado: Optional[str] = Field(None, description="Indica si existe un usuario autorizado. '0': No, '1' o '2': Sí.", example="1")
+    model_config = _REQUEST_CONFIG
+
+    imei: Imei = Field(..., description="El IMEI del dispositivo a modificar.", example="852055059447491")
+    tipo_modificacion: TipoModificacion = Field(..., description="Tipo de modificación a realizar. 1: Venta Inicial, 2: Titularidad, 3: Modificación.", example="2")
+    tipo_usuario_propietario: TipoUsuarioPropietario = Field(..., description="Tipo de usuario del NUEVO propietario.", example="1")
+    tipo_identificacion_propietario: str = Field(..., description="Tipo de ID del NUEVO propietario.", example="1")
+    identificacion_propietario: str = Field(..., description="Número de ID del NUEVO propietario.", example="222222222222")
+    nombre_razon_social_propietario: str = Field(..., description="Nombre del NUEVO propietario.", example="Fulano de Tal (Nuevo Titular)")
+    direccion_propietario: str = Field(..., description="Dirección del NUEVO propietario.", example="Calle 123 #45-67")
+    telefono_contacto_propietario: str = Field(..., description="Teléfono de contacto del NUEVO propietario.", example="3580666666")
+    tipo_usuario_autorizado: TipoUsuarioAutorizado = Field(..., description="Indica si existe un usuario autorizado. '0': No, '1' o '2': Sí.", example="1")
     imsi: Optional[str] = Field(None, description="IMSI del dispositivo (opcional).", example="732101000000001")
     msisdn: Optional[str] = Field(None, description="Número de línea (opcional).", example="3588777777")
     observaciones: Optional[str] = Field(None, description="Observaciones adicionales.", example="Cambio de titularidad por venta.")
@@ -138,76 +173,76 @@ class ModificacionPositivoRequest(BaseModel):
     direccion_autorizado: Optional[str] = Field(None, description="Dirección del autorizado. Requerido si tipo_usuario_autorizado no es '0'.", example="Avenida Siempre Viva 742")
     telefono_contacto_autorizado: Optional[str] = Field(None, description="Teléfono de contacto del autorizado. Requerido si tipo_usuario_autorizado no es '0'.", example="3580666666")
 
-    @model_validator(mode='before')
-    @classmethod
-    def check_all_fields(cls, data: Any) -> Any:
-        if not isinstance(data, dict):
-            return data
-
-        always_required = [
-            'imei', 'tipo_modificacion', 'tipo_usuario_propietario', 'tipo_identificacion_propietario',
-            'identificacion_propietario', 'nombre_razon_social_propietario', 'direccion_propietario',
-            'telefono_contacto_propietario', 'tipo_usuario_autorizado'
-        ]
-        for field in always_required:
-            if data.get(field) is None:
-                raise ValueError(f"El campo '{field}' es obligatorio.")
-
-        if data.get('tipo_modificacion') in ['2', '3']:
-            if data.get('tipo_identificacion_propietario_anterior') is None:
-                raise ValueError("El campo 'tipo_identificacion_propietario_anterior' es obligatorio cuando 'tipo_modificacion' es '2' o '3'.")
-            if data.get('identificacion_propietario_anterior') is None:
-                raise ValueError("El campo 'identificacion_propietario_anterior' es obligatorio cuando 'tipo_modificacion' es '2' o '3'.")
-
-        if data.get('tipo_usuario_autorizado') != '':
-            autorizado_fields = [
-                'tipo_identificacion_autorizado', 'identificacion_autorizado', 'nombre_razon_social_autorizado',
-                'direccion_autorizado', 'telefono_contacto_autorizado'
-            ]
-            for field in autorizado_fields:
-                if data.get(field) is None:
-                    raise ValueError(f"El campo '{field}' es obligatorio cuando 'tipo_usuario_autorizado' no es '0'.")
+    @model_validator(mode='after')
+    def check_conditional_fields(self) -> Self:
+        # Los campos siempre obligatorios los valida pydantic-core; aquí solo las reglas condicionales.
+        reglas = []
+        if self.tipo_modificacion in _MOD_POS_ANTERIOR_TIPOS:
+            reglas.append(_MOD_POS_REGLA_ANTERIOR)
+        # '0' indica que no hay usuario autorizado; solo en ese caso se omiten sus datos.
+        if self.tipo_usuario_autorizado != '0':
+            reglas.append(_MOD_POS_REGLA_AUTORIZADO)
+        _check_conditional(self, reglas)
         
-        return data
+        return self
 
 class CancelacionPositivoRequest(BaseModel):
     """Modelo para la solicitud de cancelación de un registro positivo (5001)."""
-    imei: Optional[str] = Field(None, description="IMEI a eliminar de la lista positiva.", example="852055059447491")
-    tipo_usuario_propietario: Optional[str] = Field(None, description="Tipo de usuario del propietario.", example="1")
-    tipo_identificacion_propietario: Optional[str] = Field(None, description="Tipo de identificación del propietario.", example="1")
-    identificacion_propietario: Optional[str] = Field(None, description="Número de identificación del propietario.", example="222222222222")
-    observaciones: Optional[str] = Field(None, description="Observaciones adicionales.", example="Cancelacion por fin de servicio.")
-
-    @model_validator(mode='before')
-    @classmethod
-    def check_required_fields(cls, data: Any) -> Any:
-        if isinstance(data, dict):
-            required_fields = ['imei', 'tipo_usuario_propietario', 'tipo_identificacion_propietario', 'identificacion_propietario', 'observaciones']
-            for field in required_fields:
-                if data.get(field) is None:
-                    raise ValueError(f"El campo '{field}' es obligatorio.")
-        return data
-        
+    model_config = _DEFERRED_REQUEST_CONFIG
+
+    imei: Imei = Field(..., description="IMEI a eliminar de la lista positiva.", example="852055059447491")
+    tipo_usuario_propietario: TipoUsuarioPropietario = Field(..., description="Tipo de usuario del propietario.", example="1")
+    tipo_identificacion_propietario: str = Field(..., description="Tipo de identificación del propietario.", example="1")
+    identificacion_propietario: str = Field(..., description="Número de identificación del propietario.", example="222222222222")
+    observaciones: str = Field(..., description="Observaciones adicionales.", example="Cancelacion por fin de servicio.")
+
 # --- Modelos de Consulta ---
 
 class ConsultaNegativaRequest(BaseModel):
     """Modelo para una solicitud de consulta negativa por IMEI."""
-    imei: str = Field(..., description="El IMEI del dispositivo a consultar.", example="862055059447491", min_length=15, max_length=15)
+    model_config = _REQUEST_CONFIG
+
+    imei: Imei = Field(..., description="El IMEI del dispositivo a consultar.", example="862055059447491")
 
 class ConsultaPositivaRequest(BaseModel):
     """Modelo para una solicitud de consulta positiva."""
-    imei: str = Field(..., description="El IMEI del dispositivo.", min_length=15, max_length=15)
+    model_config = _REQUEST_CONFIG
+
+    imei: Imei = Field(..., description="El IMEI del dispositivo.")
     tipo_identificacion_propietario: str = Field(..., description="Tipo de identificación del propietario. Ej: '1' para Cédula.")
     identificacion_propietario: str = Field(..., description="Número de identificación del propietario.")
 
 
 # --- Modelo de Respuesta de la API ---
 
+def format_transaction_timestamp(value: datetime) -> str:
+    """Formato de `transaction_timestamp`: 'YYYY-MM-DD HH:MM:SS.mmm' (isoformat evita interpretar una plantilla strftime)."""
+    return value.isoformat(sep=' ', timespec='milliseconds')
+
+def _utc_now_timestamp() -> str:
+    return format_transaction_timestamp(datetime.utcnow())
+
 class APIResponse(BaseModel):
     """Modelo unificado para las respuestas de la API."""
+    model_config = ConfigDict(frozen=True)
+
+    success: bool
+    http_status: int
+    message: Optional[str] = None
+    error_code: Optional[str] = None
+    raw_response: Any = Field(default=None)
+    transaction_timestamp: str = Field(default_factory=_utc_now_timestamp, description="Fecha y hora de la transacción en formato UTC.")
+
+
+class APIResponseStruct(msgspec.Struct, kw_only=True):
+    """
+    Misma respuesta que `APIResponse`, como `msgspec.Struct` para el camino caliente:
+    se instancia sin validación y se serializa directamente con `msgspec.json`.
+    `APIResponse` se mantiene como `response_model` para documentar el esquema en OpenAPI.
+    """
     success: bool
     http_status: int
     message: Optional[str] = None
     error_code: Optional[str] = None
-    raw_response: Optional[Any] = None
-    transaction_timestamp: str = Field(..., description="Fecha y hora de la transacción en formato UTC.")
\ No newline at end of file
+    raw_response: Any = None
+    transaction_timestamp: str = msgspec.field(default_factory=_utc_now_timestamp)
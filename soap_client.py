@@ -1,16 +1,20 @@
 # soap_client.py
+import atexit
 import logging
+import logging.handlers
 import os
-import html
+import queue
+import itertools
 import time
-import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
 from dataclasses import dataclass, field
-from typing import Optional
+from io import BytesIO
+from typing import Optional, Tuple
 
-from zeep import Client, Settings, Transport
-from zeep.exceptions import Fault
-from requests import Session
+import httpx
+from requests import HTTPError, Session
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from lxml import etree
 from dotenv import load_dotenv
 
@@ -34,7 +38,85 @@ if not logger.hasHandlers():
     file_handler = logging.FileHandler(os.path.join(log_dir, 'srtm_api.log'), mode='a', encoding='utf-8')
     formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
     file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
+    # La escritura a disco la hace un hilo QueueListener; quien registra solo encola el record.
+    log_queue = queue.Queue(-1)
+    log_listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+    log_listener.start()
+    atexit.register(log_listener.stop)
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+
+# Namespace declarado en la raíz de MensajeBDA
+XSI_NS = "http://www.w3.org/2001/XMLSchema-instance"
+# Declaración con el mismo formato que se ha enviado siempre (lxml usaría comillas simples)
+XML_DECLARATION = b'<?xml version="1.0" encoding="UTF-8"?>\n'
+ENVELOPE_TAIL = b']]></xmlMsg></ns1:receiveMessage></soap:Body></soap:Envelope>'
+SOAP_PART_HEAD = b'\r\nContent-Type: text/xml; charset=utf-8\r\nContent-ID: '
+
+# Tabla de escape XML para las credenciales del sobre (mismo resultado que html.escape(quote=True))
+_XML_ESCAPE = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#x27;'})
+
+# --- Campos de cada cuerpo de solicitud: (etiqueta XML, atributo del request, obligatorio), en el orden del XSD ---
+# Los obligatorios se escriben siempre (aunque lleguen vacíos); los opcionales solo si vienen informados.
+OBLIGATORIO = True
+OPCIONAL = False
+
+_CAMPOS_REGISTRO_POSITIVO = (
+    ("Imei", "imei", OBLIGATORIO),
+    ("Imsi", "imsi", OPCIONAL),
+    ("Msisdn", "msisdn", OPCIONAL),
+    ("NombreRazonSocialPropietario", "nombre_razon_social_propietario", OPCIONAL),
+    ("DireccionPropietario", "direccion_propietario", OPCIONAL),
+    ("TipoUsuarioPropietario", "tipo_usuario_propietario", OBLIGATORIO),
+    ("TipoIdentificacionPropietario", "tipo_identificacion_propietario", OBLIGATORIO),
+    ("IdentificacionPropietario", "identificacion_propietario", OBLIGATORIO),
+    ("TelefonoContactoPropietario", "telefono_contacto_propietario", OPCIONAL),
+)
+# Imei, Tecnologia y FechaReporte se agregan antes, en el propio builder
+_CAMPOS_REGISTRO_NEGATIVO = (
+    ("NombreRazonSocialReporte", "nombre_reporte", OPCIONAL),
+    ("TipoIdentificacionReporte", "tipo_identificacion_reporte", OPCIONAL),
+    ("IdentificacionReporte", "identificacion_reporte", OPCIONAL),
+    ("DireccionReporte", "direccion_reporte", OPCIONAL),
+    ("TelefonoContactoReporte", "telefono_reporte", OPCIONAL),
+    ("DepartamentoReporte", "departamento_reporte", OPCIONAL),
+    ("CiudadReporte", "ciudad_reporte", OPCIONAL),
+    ("TipoReporte", "tipo_reporte", OBLIGATORIO),
+    ("EmpleoViolencia", "empleo_violencia", OPCIONAL),
+    ("UtilizacionArmas", "utilizacion_armas", OPCIONAL),
+    ("VictimaMenorEdad", "victima_menor_edad", OPCIONAL),
+    ("CorreoElectronico", "correo_electronico", OPCIONAL),
+)
+_CAMPOS_CANCELACION_NEGATIVO = (
+    ("Imei", "imei", OBLIGATORIO),
+    ("FechaReporte", "fecha_reporte", OBLIGATORIO),
+)
+_CAMPOS_MODIFICACION_POSITIVO = (
+    ("Imei", "imei", OBLIGATORIO),
+    ("Imsi", "imsi", OPCIONAL),
+    ("Msisdn", "msisdn", OPCIONAL),
+    ("NombreRazonSocialPropietario", "nombre_razon_social_propietario", OBLIGATORIO),
+    ("DireccionPropietario", "direccion_propietario", OBLIGATORIO),
+    ("TipoUsuarioPropietario", "tipo_usuario_propietario", OBLIGATORIO),
+    ("TipoIdentificacionPropietario", "tipo_identificacion_propietario", OBLIGATORIO),
+    ("IdentificacionPropietario", "identificacion_propietario", OBLIGATORIO),
+    ("TelefonoContactoPropietario", "telefono_contacto_propietario", OBLIGATORIO),
+    # Campos de autorizado (se envían si existen)
+    ("NombreRazonSocialAutorizado", "nombre_razon_social_autorizado", OPCIONAL),
+    ("TipoUsuarioAutorizado", "tipo_usuario_autorizado", OPCIONAL),
+    ("TipoIdentificacionAutorizado", "tipo_identificacion_autorizado", OPCIONAL),
+    ("IdentificacionAutorizado", "identificacion_autorizado", OPCIONAL),
+    ("TelefonoContactoAutorizado", "telefono_contacto_autorizado", OPCIONAL),
+    # Campos de propietario anterior
+    ("TipoIdentificacionPropietarioAnterior", "tipo_identificacion_propietario_anterior", OPCIONAL),
+    ("IdentificacionPropietarioAnterior", "identificacion_propietario_anterior", OPCIONAL),
+    ("TipoModificacion", "tipo_modificacion", OBLIGATORIO),
+)
+_CAMPOS_CANCELACION_POSITIVO = (
+    ("Imei", "imei", OBLIGATORIO),
+    ("TipoUsuarioPropietario", "tipo_usuario_propietario", OBLIGATORIO),
+    ("TipoIdentificacionPropietario", "tipo_identificacion_propietario", OBLIGATORIO),
+    ("IdentificacionPropietario", "identificacion_propietario", OBLIGATORIO),
+)
 
 # --- Modelo de Respuesta Unificado ---
 @dataclass
@@ -52,235 +134,349 @@ class SRTMResponse:
 class SRTMAxisClient:
     SERVICE_NAMESPACE = "http://service.client.xcewsmulti.iecisa.es"
     OPERADOR_ID = "00020" 
+    # Variable de entorno del TipoMsg -> prefijo del IdentificadorProceso (cada builder lee aquí su prefijo)
+    PROCESS_TYPES = {
+        "MSG_TYPE_REGISTRO_POSITIVO": "01",
+        "MSG_TYPE_REGISTRO_NEGATIVO": "02",
+        "MSG_TYPE_CANCELACION_NEGATIVO": "03",
+        "MSG_TYPE_MODIFICACION_POSITIVO": "04",
+        "MSG_TYPE_CANCELACION_POSITIVO": "05",
+    }
+    # Tamaño del pool de conexiones keep-alive hacia el endpoint SRTM
+    POOL_SIZE = 32
+    # Sesión HTTP compartida por todas las instancias (reutiliza sockets/TLS entre tipos de mensaje)
+    _shared_session: Optional[Session] = None
+
+    @classmethod
+    def _get_session(cls) -> Session:
+        if cls._shared_session is None:
+            session = Session()
+            # Solo se reintentan fallos de conexión: urllib3 no reintenta un POST por estado
+            # HTTP ni por error de lectura, así que no hay riesgo de enviar dos veces un mensaje.
+            adapter = HTTPAdapter(
+                pool_connections=cls.POOL_SIZE,
+                pool_maxsize=cls.POOL_SIZE,
+                max_retries=Retry(total=3, backoff_factor=0.2),
+            )
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.headers.update({'SOAPAction': '""'})
+            cls._shared_session = session
+        return cls._shared_session
 
     def __init__(self, endpoint: str, user_id: str, password: str):
+        self._init_common(endpoint, user_id, password)
+        # El sobre SOAP y el multipart se arman a mano, así que basta una sesión HTTP
+        # (sin cargar ni compilar el WSDL).
+        self.session = self._get_session()
+        logger.info("🔧 Cliente SRTM Python inicializado correctamente.")
+
+    def _init_common(self, endpoint: str, user_id: str, password: str) -> None:
+        """Estado compartido por los clientes síncrono y asíncrono (todo salvo el transporte HTTP)."""
         if not all([endpoint, user_id, password]):
             raise ValueError("Endpoint, User ID, and Password must be provided.")
         self.endpoint = endpoint
         self.user_id = user_id
         self.password = password
-        self.message_counter = int(time.time()) % 100000
-        self.proc_counter = int(time.time()) % 100000
+        # Consecutivos de mensaje y de proceso (next() sobre itertools.count es atómico con el GIL)
+        seed = int(time.time()) % 100000
+        self._message_counter = itertools.count(seed + 1)
+        self._proc_counter = itertools.count(seed + 1)
+        # Fecha YYYYMMDD cacheada hasta la próxima medianoche local
+        self._date_str = ""
+        self._date_expires = 0.0
 
-        try:
-            wsdl_path = 'srtm_minimal.wsdl'
-            self.client = Client(wsdl=wsdl_path, transport=Transport(session=Session(), timeout=30), settings=Settings(strict=False, xml_huge_tree=True))
-            self.client.service._binding_options['address'] = self.endpoint
-        except FileNotFoundError:
-            logger.critical("Error Crítico: No se encontró 'srtm_minimal.wsdl'.")
-            raise
-        except Exception as e:
-            logger.critical(f"Error Crítico al inicializar el cliente SOAP: {e}")
-            raise
-        logger.info("🔧 Cliente SRTM Python (Zeep) inicializado correctamente.")
+        # Tipos de mensaje leídos del entorno una sola vez
+        self._msg_types = {env_var: os.getenv(env_var) for env_var in self.PROCESS_TYPES}
+
+        # Partes invariables del multipart (ya codificadas); por petición solo cambian el
+        # boundary, el Content-ID inicial, el sobre SOAP y el TipoMsg.
+        self._sender_part = b'\r\nContent-Type: text/plain\r\nContent-ID: <sender>\r\n\r\n' + self.OPERADOR_ID.encode()
+        self._receiver_part = b'\r\nContent-Type: text/plain\r\nContent-ID: <receiver>\r\n\r\n00000'
+        self._type_msg_head = b'\r\nContent-Type: text/plain\r\nContent-ID: <typeMsg>\r\n\r\n'
+        # El sobre SOAP solo varía en el xmlMsg: cabeza (con credenciales) y cola ya en bytes
+        self._envelope_head = (
+            f'<?xml version="1.0" encoding="UTF-8"?><soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/"><soap:Body>'
+            f'<ns1:receiveMessage xmlns:ns1="{self.SERVICE_NAMESPACE}">'
+            f'<userId>{self._escape_xml(user_id)}</userId><password>{self._escape_xml(password)}</password><xmlMsg><![CDATA['
+        ).encode('utf-8')
+
+    def _today(self) -> str:
+        """Fecha local en formato YYYYMMDD; solo se recalcula al pasar la medianoche."""
+        if time.time() >= self._date_expires:
+            now = datetime.now()
+            self._date_str = now.strftime("%Y%m%d")
+            self._date_expires = datetime.combine(now.date() + timedelta(days=1), datetime.min.time()).timestamp()
+        return self._date_str
 
     def _generate_id(self, prefix: str, length: int) -> str:
-        timestamp = datetime.now().strftime("%Y%m%d")
+        timestamp = self._today()
         if prefix == "msg":
-            self.message_counter += 1
-            sequence = f"{self.message_counter:07d}"
-            return f"{self.OPERADOR_ID}{timestamp}{sequence}"
-        else: 
-            self.proc_counter += 1
-            sequence = f"{self.proc_counter:05d}"
-            return f"{self.OPERADOR_ID}{timestamp}{prefix}{sequence}"
+            return f"{self.OPERADOR_ID}{timestamp}{next(self._message_counter):07d}"
+        return f"{self.OPERADOR_ID}{timestamp}{prefix}{next(self._proc_counter):05d}"
 
     @staticmethod
     def _get_current_datetime() -> str:
-        return datetime.now().strftime("%Y%m%d%H%M%S")
+        # time.strftime formatea directamente el struct_time local, sin crear un datetime
+        return time.strftime("%Y%m%d%H%M%S")
 
     @staticmethod
     def _escape_xml(text: Optional[str]) -> str:
-        return html.escape(text, quote=True) if text else ""
-
-    def _build_xml(self, msg_type: str, body_content: str, observaciones: Optional[str]) -> str:
-        process_type_map = {
-            os.getenv("MSG_TYPE_REGISTRO_POSITIVO"): "01",
-            os.getenv("MSG_TYPE_REGISTRO_NEGATIVO"): "02",
-            os.getenv("MSG_TYPE_CANCELACION_NEGATIVO"): "03",
-            os.getenv("MSG_TYPE_MODIFICACION_POSITIVO"): "04",
-            os.getenv("MSG_TYPE_CANCELACION_POSITIVO"): "05",
-        }
-        process_id = self._generate_id(process_type_map.get(msg_type, "00"), 5)
+        return text.translate(_XML_ESCAPE) if text else ""
+
+    @staticmethod
+    def _make_element(parent: etree._Element, tag: str, value: Optional[str], obligatorio: bool = OPCIONAL) -> None:
+        """
+        Agrega <tag>value</tag> a `parent` (lxml se encarga del escape). Un elemento opcional
+        solo se agrega si el valor viene informado; uno obligatorio se escribe siempre.
+        """
+        if value or obligatorio:
+            etree.SubElement(parent, tag).text = value or ""
+
+    @classmethod
+    def _fill_body(cls, body: etree._Element, req, campos: Tuple[Tuple[str, str, bool], ...]) -> None:
+        """Agrega en orden los campos (etiqueta, atributo del request, obligatorio) de la tabla."""
+        for tag, attr, obligatorio in campos:
+            cls._make_element(body, tag, getattr(req, attr), obligatorio)
+
+    @classmethod
+    def _make_body(cls, root_tag: str, req, campos: Tuple[Tuple[str, str, bool], ...]) -> etree._Element:
+        body = etree.Element(root_tag)
+        cls._fill_body(body, req, campos)
+        return body
+
+    def _build_xml(self, msg_type: str, process_prefix: str, body: etree._Element, observaciones: Optional[str]) -> bytes:
+        process_id = self._generate_id(process_prefix, 5)
         message_id = self._generate_id("msg", 7)
-        
-        xml_parts = [
-            '<?xml version="1.0" encoding="UTF-8"?>',
-            '<MensajeBDA xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">',
-            '\t<CabeceraMensaje>',
-            f'\t\t<IdentificadorProceso>{process_id}</IdentificadorProceso>',
-            f'\t\t<IdentificadorMensaje>{message_id}</IdentificadorMensaje>',
-            f'\t\t<FechaCreacionMsg>{self._get_current_datetime()}</FechaCreacionMsg>',
-            f'\t\t<TipoMsg>{msg_type}</TipoMsg>',
-            f'\t\t<Emisor>{self.OPERADOR_ID}</Emisor>',
-            '\t\t<Destinatario>00000</Destinatario>',
-            f'\t\t<Observaciones>{self._escape_xml(observaciones)}</Observaciones>' if observaciones else '',
-            '\t</CabeceraMensaje>',
-            '\t<CuerpoMensaje>',
-            body_content,
-            '\t</CuerpoMensaje>',
-            '</MensajeBDA>'
-        ]
-        return '\n'.join(filter(None, xml_parts))
-
-    def _send_request(self, msg_type: str, xml_payload: str) -> SRTMResponse:
+
+        root = etree.Element("MensajeBDA", nsmap={"xsi": XSI_NS})
+        cabecera = etree.SubElement(root, "CabeceraMensaje")
+        etree.SubElement(cabecera, "IdentificadorProceso").text = process_id
+        etree.SubElement(cabecera, "IdentificadorMensaje").text = message_id
+        etree.SubElement(cabecera, "FechaCreacionMsg").text = self._get_current_datetime()
+        etree.SubElement(cabecera, "TipoMsg").text = msg_type
+        etree.SubElement(cabecera, "Emisor").text = self.OPERADOR_ID
+        etree.SubElement(cabecera, "Destinatario").text = "00000"
+        self._make_element(cabecera, "Observaciones", observaciones)
+        etree.SubElement(root, "CuerpoMensaje").append(body)
+        return XML_DECLARATION + etree.tostring(root, encoding="UTF-8", xml_declaration=False)
+
+    def _build_multipart(self, msg_type: str, xml_payload: bytes) -> Tuple[bytes, dict]:
+        """Arma el multipart/related (sobre SOAP + sender/receiver/typeMsg) y sus cabeceras."""
+        # El XML interno viaja tal cual dentro de un CDATA (sin escapar cada '<');
+        # un ']]>' literal se parte en dos secciones CDATA.
+        if b']]>' in xml_payload:
+            xml_payload = xml_payload.replace(b']]>', b']]]]><![CDATA[>')
+
+        # 32 bytes aleatorios en una sola lectura: la mitad para el boundary y la otra para el Content-ID
+        rand = os.urandom(32).hex()
+        boundary = '----=' + rand[:32]
+        start_cid = '<' + rand[32:] + '>'
+        boundary_b = boundary.encode('ascii')
+        delimiter = b'\r\n--' + boundary_b
+        payload = b"".join([
+            b'--', boundary_b, SOAP_PART_HEAD, start_cid.encode('ascii'),
+            b'\r\n\r\n', self._envelope_head, xml_payload, ENVELOPE_TAIL,
+            delimiter, self._sender_part,
+            delimiter, self._receiver_part,
+            delimiter, self._type_msg_head, msg_type.encode('ascii'),
+            delimiter, b'--',
+        ])
+        headers = {'Content-Type': f'multipart/related; type="text/xml"; start="{start_cid}"; boundary="{boundary}"'}
+        return payload, headers
+
+    @staticmethod
+    def _apply_result(response: SRTMResponse, msg_type: str, content: bytes) -> None:
+        """Interpreta el receiveMessageReturn ('ack' o código de rechazo) sobre `response`."""
+        # Solo interesa receiveMessageReturn: se deja de leer en cuanto aparece
+        result_text = ''
+        for _, elem in etree.iterparse(BytesIO(content), events=('end',), tag='{*}receiveMessageReturn'):
+            result_text = (elem.text or '').strip()
+            elem.clear()
+            break
+
+        response.raw_response = result_text
+        if result_text == "ack":
+            response.success = True
+            response.message = f"Solicitud {msg_type} aceptada."
+        else:
+            response.success = False
+            response.message = f"Solicitud {msg_type} rechazada por el servidor."
+            response.error_code = result_text
+
+    @staticmethod
+    def _log_inicio(msg_type: str, xml_payload: bytes) -> None:
+        logger.info("--- INICIO TRANSACCIÓN (TipoMsg: %s) ---", msg_type)
+        # El XML completo solo se escribe en DEBUG (puede ocupar varios KB por petición)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Request XML (TipoMsg: %s):\n%s", msg_type, xml_payload.decode('utf-8'))
+
+    @staticmethod
+    def _log_fin(msg_type: str, response: SRTMResponse) -> None:
+        logger.info(
+            "--- FIN TRANSACCIÓN (TipoMsg: %s) ---\n"
+            "Resultado: %s | Mensaje: %s | Respuesta Raw: %s | Duración: %.2f ms",
+            msg_type, 'Éxito' if response.success else 'Fallo', response.message,
+            response.raw_response, response.response_time_ms
+        )
+
+    def _send_request(self, msg_type: str, xml_payload: bytes) -> SRTMResponse:
         # Se captura el timestamp al inicio del envío
         transaction_time = datetime.utcnow()
         response = SRTMResponse(timestamp=transaction_time)
         start_time = time.time()
-        
-        logger.info(f"--- INICIO TRANSACCIÓN (TipoMsg: {msg_type}) ---\nRequest XML:\n{xml_payload}")
+        self._log_inicio(msg_type, xml_payload)
 
         try:
-            escaped_xml = self._escape_xml(xml_payload)
-            soap_envelope = (
-                f'<?xml version="1.0" encoding="UTF-8"?><soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/"><soap:Body>'
-                f'<ns1:receiveMessage xmlns:ns1="{self.SERVICE_NAMESPACE}">'
-                f'<userId>{self.user_id}</userId><password>{self.password}</password><xmlMsg>{escaped_xml}</xmlMsg>'
-                f'</ns1:receiveMessage></soap:Body></soap:Envelope>'
-            )
-
-            boundary = f'----={uuid.uuid4().hex}'
-            start_cid = f'<{uuid.uuid4().hex}>'
-            payload = "\r\n".join([
-                f'--{boundary}', 'Content-Type: text/xml; charset=utf-8', f'Content-ID: {start_cid}', '', soap_envelope,
-                f'--{boundary}', 'Content-Type: text/plain', 'Content-ID: <sender>', '', self.OPERADOR_ID,
-                f'--{boundary}', 'Content-Type: text/plain', 'Content-ID: <receiver>', '', '00000',
-                f'--{boundary}', 'Content-Type: text/plain', 'Content-ID: <typeMsg>', '', msg_type, f'--{boundary}--'
-            ])
-            headers = {'Content-Type': f'multipart/related; type="text/xml"; start="{start_cid}"; boundary="{boundary}"', 'SOAPAction': '""'}
-
-            http_res = self.client.transport.session.post(self.endpoint, data=payload.encode('utf-8'), headers=headers, timeout=30)
+            payload, headers = self._build_multipart(msg_type, xml_payload)
+            http_res = self.session.post(self.endpoint, data=payload, headers=headers, timeout=30)
             
             response.http_status = http_res.status_code
             http_res.raise_for_status()
+            self._apply_result(response, msg_type, http_res.content)
 
-            res_env = etree.fromstring(http_res.content)
-            result_text = res_env.findtext('.//{*}receiveMessageReturn', default='').strip()
-            
-            response.raw_response = result_text
-            if result_text == "ack":
-                response.success = True
-                response.message = f"Solicitud {msg_type} aceptada."
-            else:
-                response.success = False
-                response.message = f"Solicitud {msg_type} rechazada por el servidor."
-                response.error_code = result_text
-
-        except Fault as fault:
-            logger.error(f"SOAP Fault (TipoMsg: {msg_type}): {fault.message}", exc_info=True)
-            response.message = f"Error SOAP: {fault.message}"
-            response.raw_response = str(fault.detail)
+        except HTTPError as e:
+            # Respuesta HTTP de error (p. ej. un SOAP Fault con 500): se conserva el cuerpo devuelto.
+            logger.error("Error HTTP (TipoMsg: %s): %s", msg_type, e)
+            response.message = f"Error HTTP del servicio SRTM: {e}"
+            response.raw_response = e.response.text if e.response is not None else None
         except Exception as e:
-            logger.error(f"Error inesperado (TipoMsg: {msg_type}): {e}", exc_info=True)
+            logger.error("Error inesperado (TipoMsg: %s): %s", msg_type, e, exc_info=True)
             response.message = f"Error inesperado en la comunicación: {str(e)}"
         finally:
             response.response_time_ms = (time.time() - start_time) * 1000
-            log_message = (
-                f"--- FIN TRANSACCIÓN (TipoMsg: {msg_type}) ---\n"
-                f"Resultado: {'Éxito' if response.success else 'Fallo'} | Mensaje: {response.message} | "
-                f"Respuesta Raw: {response.raw_response} | Duración: {response.response_time_ms:.2f} ms"
-            )
-            logger.info(log_message)
+            self._log_fin(msg_type, response)
 
         return response
 
-    def registrar_positivo(self, req: RegistroPositivoRequest) -> SRTMResponse:
-        body = (
-            f"<SolicitudRegistroPositivo>"
-            f"<Imei>{req.imei}</Imei>" +
-            (f"<Imsi>{self._escape_xml(req.imsi)}</Imsi>" if req.imsi else "") +
-            (f"<Msisdn>{self._escape_xml(req.msisdn)}</Msisdn>" if req.msisdn else "") +
-            (f"<NombreRazonSocialPropietario>{self._escape_xml(req.nombre_razon_social_propietario)}</NombreRazonSocialPropietario>" if req.nombre_razon_social_propietario else "") +
-            (f"<DireccionPropietario>{self._escape_xml(req.direccion_propietario)}</DireccionPropietario>" if req.direccion_propietario else "") +
-            f"<TipoUsuarioPropietario>{req.tipo_usuario_propietario}</TipoUsuarioPropietario>"
-            f"<TipoIdentificacionPropietario>{req.tipo_identificacion_propietario}</TipoIdentificacionPropietario>"
-            f"<IdentificacionPropietario>{self._escape_xml(req.identificacion_propietario)}</IdentificacionPropietario>" +
-            (f"<TelefonoContactoPropietario>{self._escape_xml(req.telefono_contacto_propietario)}</TelefonoContactoPropietario>" if req.telefono_contacto_propietario else "") +
-            f"</SolicitudRegistroPositivo>"
-        )
-        xml_payload = self._build_xml(os.getenv("MSG_TYPE_REGISTRO_POSITIVO"), body, req.observaciones)
-        return self._send_request(os.getenv("MSG_TYPE_REGISTRO_POSITIVO"), xml_payload)
+    def _build_registro_positivo(self, req: RegistroPositivoRequest) -> Tuple[str, bytes]:
+        body = self._make_body("SolicitudRegistroPositivo", req, _CAMPOS_REGISTRO_POSITIVO)
+        msg_type = self._msg_types["MSG_TYPE_REGISTRO_POSITIVO"]
+        return msg_type, self._build_xml(msg_type, self.PROCESS_TYPES["MSG_TYPE_REGISTRO_POSITIVO"], body, req.observaciones)
 
-    def registrar_negativo(self, req: RegistroNegativoRequest) -> SRTMResponse:
-        body = (
-            f"<SolicitudRegistroNegativo>"
-            f"<Imei>{req.imei}</Imei>"
-            f"<Tecnologia>01</Tecnologia>"
-            f"<FechaReporte>{self._get_current_datetime()}</FechaReporte>" +
-            (f"<NombreRazonSocialReporte>{self._escape_xml(req.nombre_reporte)}</NombreRazonSocialReporte>" if req.nombre_reporte else "") +
-            (f"<TipoIdentificacionReporte>{self._escape_xml(req.tipo_identificacion_reporte)}</TipoIdentificacionReporte>" if req.tipo_identificacion_reporte else "") +
-            (f"<IdentificacionReporte>{self._escape_xml(req.identificacion_reporte)}</IdentificacionReporte>" if req.identificacion_reporte else "") +
-            (f"<DireccionReporte>{self._escape_xml(req.direccion_reporte)}</DireccionReporte>" if req.direccion_reporte else "") +
-            (f"<TelefonoContactoReporte>{self._escape_xml(req.telefono_reporte)}</TelefonoContactoReporte>" if req.telefono_reporte else "") +
-            (f"<DepartamentoReporte>{self._escape_xml(req.departamento_reporte)}</DepartamentoReporte>" if req.departamento_reporte else "") +
-            (f"<CiudadReporte>{self._escape_xml(req.ciudad_reporte)}</CiudadReporte>" if req.ciudad_reporte else "") +
-            f"<TipoReporte>{req.tipo_reporte}</TipoReporte>" +
-            (f"<EmpleoViolencia>{req.empleo_violencia}</EmpleoViolencia>" if req.empleo_violencia is not None else "") +
-            (f"<UtilizacionArmas>{req.utilizacion_armas}</UtilizacionArmas>" if req.utilizacion_armas is not None else "") +
-            (f"<VictimaMenorEdad>{req.victima_menor_edad}</VictimaMenorEdad>" if req.victima_menor_edad is not None else "") +
-            (f"<CorreoElectronico>{self._escape_xml(req.correo_electronico)}</CorreoElectronico>" if req.correo_electronico else "") +
-            f"</SolicitudRegistroNegativo>"
-        )
-        xml_payload = self._build_xml(os.getenv("MSG_TYPE_REGISTRO_NEGATIVO"), body, req.observaciones)
-        return self._send_request(os.getenv("MSG_TYPE_REGISTRO_NEGATIVO"), xml_payload)
+    def _build_registro_negativo(self, req: RegistroNegativoRequest) -> Tuple[str, bytes]:
+        body = etree.Element("SolicitudRegistroNegativo")
+        self._make_element(body, "Imei", req.imei, OBLIGATORIO)
+        self._make_element(body, "Tecnologia", "01", OBLIGATORIO)
+        self._make_element(body, "FechaReporte", self._get_current_datetime(), OBLIGATORIO)
+        self._fill_body(body, req, _CAMPOS_REGISTRO_NEGATIVO)
+        msg_type = self._msg_types["MSG_TYPE_REGISTRO_NEGATIVO"]
+        return msg_type, self._build_xml(msg_type, self.PROCESS_TYPES["MSG_TYPE_REGISTRO_NEGATIVO"], body, req.observaciones)
 
-    def cancelar_negativo(self, req: CancelacionNegativoRequest) -> SRTMResponse:
+    def _build_cancelacion_negativo(self, req: CancelacionNegativoRequest) -> Tuple[str, bytes]:
         """
-        Procesa una solicitud de cancelación de registro negativo (3001).
+        Construye una solicitud de cancelación de registro negativo (3001).
         Utiliza la fecha_reporte proporcionada en el request en lugar de la fecha actual.
         
         Args:
             req (CancelacionNegativoRequest): Objeto con los datos de la cancelación
             
         Returns:
-            SRTMResponse: Respuesta del servicio SOAP
+            Tuple[str, bytes]: TipoMsg y XML MensajeBDA listo para enviar
         """
-        body = (
-            f"<SolicitudCancelacionRegistroNegativo>"
-            f"<Imei>{req.imei}</Imei>"
-            f"<FechaReporte>{req.fecha_reporte}</FechaReporte>"
-            f"</SolicitudCancelacionRegistroNegativo>"
-        )
-        xml_payload = self._build_xml(os.getenv("MSG_TYPE_CANCELACION_NEGATIVO"), body, req.observaciones)
-        return self._send_request(os.getenv("MSG_TYPE_CANCELACION_NEGATIVO"), xml_payload)
+        body = self._make_body("SolicitudCancelacionRegistroNegativo", req, _CAMPOS_CANCELACION_NEGATIVO)
+        msg_type = self._msg_types["MSG_TYPE_CANCELACION_NEGATIVO"]
+        return msg_type, self._build_xml(msg_type, self.PROCESS_TYPES["MSG_TYPE_CANCELACION_NEGATIVO"], body, req.observaciones)
+
+    def _build_modificacion_positivo(self, req: ModificacionPositivoRequest) -> Tuple[str, bytes]:
+        body = self._make_body("SolicitudModificacionRegistroPositivo", req, _CAMPOS_MODIFICACION_POSITIVO)
+        msg_type = self._msg_types["MSG_TYPE_MODIFICACION_POSITIVO"]
+        return msg_type, self._build_xml(msg_type, self.PROCESS_TYPES["MSG_TYPE_MODIFICACION_POSITIVO"], body, req.observaciones)
+
+    def _build_cancelacion_positivo(self, req: CancelacionPositivoRequest) -> Tuple[str, bytes]:
+        body = self._make_body("SolicitudCancelacionRegistroPositivo", req, _CAMPOS_CANCELACION_POSITIVO)
+        msg_type = self._msg_types["MSG_TYPE_CANCELACION_POSITIVO"]
+        return msg_type, self._build_xml(msg_type, self.PROCESS_TYPES["MSG_TYPE_CANCELACION_POSITIVO"], body, req.observaciones)
+
+    # --- Acciones SRTM ---
+
+    def registrar_positivo(self, req: RegistroPositivoRequest) -> SRTMResponse:
+        return self._send_request(*self._build_registro_positivo(req))
+
+    def registrar_negativo(self, req: RegistroNegativoRequest) -> SRTMResponse:
+        return self._send_request(*self._build_registro_negativo(req))
+
+    def cancelar_negativo(self, req: CancelacionNegativoRequest) -> SRTMResponse:
+        return self._send_request(*self._build_cancelacion_negativo(req))
 
     def modificar_positivo(self, req: ModificacionPositivoRequest) -> SRTMResponse:
-        # Construcción del cuerpo del XML para modificación, incluyendo campos de autorizado
-        body = (
-            f"<SolicitudModificacionRegistroPositivo>"
-            f"<Imei>{req.imei}</Imei>" +
-            (f"<Imsi>{self._escape_xml(req.imsi)}</Imsi>" if req.imsi else "") +
-            (f"<Msisdn>{self._escape_xml(req.msisdn)}</Msisdn>" if req.msisdn else "") +
-            (f"<NombreRazonSocialPropietario>{self._escape_xml(req.nombre_razon_social_propietario)}</NombreRazonSocialPropietario>") +
-            (f"<DireccionPropietario>{self._escape_xml(req.direccion_propietario)}</DireccionPropietario>") +
-            f"<TipoUsuarioPropietario>{req.tipo_usuario_propietario}</TipoUsuarioPropietario>"
-            f"<TipoIdentificacionPropietario>{req.tipo_identificacion_propietario}</TipoIdentificacionPropietario>"
-            f"<IdentificacionPropietario>{self._escape_xml(req.identificacion_propietario)}</IdentificacionPropietario>" +
-            (f"<TelefonoContactoPropietario>{self._escape_xml(req.telefono_contacto_propietario)}</TelefonoContactoPropietario>") +
-            # Campos de autorizado (se envían si existen)
-            (f"<NombreRazonSocialAutorizado>{self._escape_xml(req.nombre_razon_social_autorizado)}</NombreRazonSocialAutorizado>" if req.nombre_razon_social_autorizado else "") +
-            (f"<TipoUsuarioAutorizado>{req.tipo_usuario_autorizado}</TipoUsuarioAutorizado>" if req.tipo_usuario_autorizado else "") +
-            (f"<TipoIdentificacionAutorizado>{req.tipo_identificacion_autorizado}</TipoIdentificacionAutorizado>" if req.tipo_identificacion_autorizado else "") +
-            (f"<IdentificacionAutorizado>{self._escape_xml(req.identificacion_autorizado)}</IdentificacionAutorizado>" if req.identificacion_autorizado else "") +
-            (f"<TelefonoContactoAutorizado>{self._escape_xml(req.telefono_contacto_autorizado)}</TelefonoContactoAutorizado>" if req.telefono_contacto_autorizado else "") +
-            # Campos de propietario anterior
-            (f"<TipoIdentificacionPropietarioAnterior>{self._escape_xml(req.tipo_identificacion_propietario_anterior)}</TipoIdentificacionPropietarioAnterior>" if req.tipo_identificacion_propietario_anterior else "") +
-            (f"<IdentificacionPropietarioAnterior>{self._escape_xml(req.identificacion_propietario_anterior)}</IdentificacionPropietarioAnterior>" if req.identificacion_propietario_anterior else "") +
-            f"<TipoModificacion>{req.tipo_modificacion}</TipoModificacion>"
-            f"</SolicitudModificacionRegistroPositivo>"
-        )
-        xml_payload = self._build_xml(os.getenv("MSG_TYPE_MODIFICACION_POSITIVO"), body, req.observaciones)
-        return self._send_request(os.getenv("MSG_TYPE_MODIFICACION_POSITIVO"), xml_payload)
+        return self._send_request(*self._build_modificacion_positivo(req))
 
     def cancelar_positivo(self, req: CancelacionPositivoRequest) -> SRTMResponse:
-        body = (
-            f"<SolicitudCancelacionRegistroPositivo>"
-            f"<Imei>{req.imei}</Imei>"
-            f"<TipoUsuarioPropietario>{req.tipo_usuario_propietario}</TipoUsuarioPropietario>"
-            f"<TipoIdentificacionPropietario>{req.tipo_identificacion_propietario}</TipoIdentificacionPropietario>"
-            f"<IdentificacionPropietario>{self._escape_xml(req.identificacion_propietario)}</IdentificacionPropietario>"
-            f"</SolicitudCancelacionRegistroPositivo>"
+        return self._send_request(*self._build_cancelacion_positivo(req))
+
+
+class SRTMAxisClientAsync(SRTMAxisClient):
+    """
+    Variante asíncrona del cliente de acciones sobre httpx (HTTP/2, pool keep-alive).
+
+    Reutiliza la construcción del MensajeBDA y del multipart de `SRTMAxisClient`; solo
+    cambia el transporte. Los envíos por lote se lanzan en paralelo con asyncio.gather:
+
+        respuestas = await asyncio.gather(*(client.registrar_positivo_async(r) for r in lote))
+    """
+
+    def __init__(self, endpoint: str, user_id: str, password: str):
+        # No se llama a SRTMAxisClient.__init__: la sesión de requests no se usa aquí.
+        self._init_common(endpoint, user_id, password)
+        # Como en la sesión síncrona, el transporte solo reintenta fallos de conexión
+        # (nunca un POST ya entregado).
+        self._client = httpx.AsyncClient(
+            transport=httpx.AsyncHTTPTransport(
+                http2=True,
+                limits=httpx.Limits(max_connections=64, max_keepalive_connections=64),
+                retries=3,
+            ),
+            timeout=30.0,
+            headers={'SOAPAction': '""'},
         )
-        xml_payload = self._build_xml(os.getenv("MSG_TYPE_CANCELACION_POSITIVO"), body, req.observaciones)
-        return self._send_request(os.getenv("MSG_TYPE_CANCELACION_POSITIVO"), xml_payload)
+        logger.info("🔧 Cliente SRTM asíncrono inicializado correctamente.")
+
+    def _send_request(self, msg_type: str, xml_payload: bytes) -> SRTMResponse:
+        raise TypeError("SRTMAxisClientAsync no tiene transporte síncrono; use los métodos *_async.")
+
+    async def aclose(self) -> None:
+        """Cierra el pool de conexiones del cliente HTTP."""
+        await self._client.aclose()
+
+    async def _send_request_async(self, msg_type: str, xml_payload: bytes) -> SRTMResponse:
+        transaction_time = datetime.utcnow()
+        response = SRTMResponse(timestamp=transaction_time)
+        start_time = time.time()
+        self._log_inicio(msg_type, xml_payload)
+
+        try:
+            payload, headers = self._build_multipart(msg_type, xml_payload)
+            http_res = await self._client.post(self.endpoint, content=payload, headers=headers)
+
+            response.http_status = http_res.status_code
+            http_res.raise_for_status()
+            self._apply_result(response, msg_type, http_res.content)
+
+        except httpx.HTTPStatusError as e:
+            logger.error("Error HTTP (TipoMsg: %s): %s", msg_type, e)
+            response.message = f"Error HTTP del servicio SRTM: {e}"
+            response.raw_response = e.response.text
+        except Exception as e:
+            logger.error("Error inesperado (TipoMsg: %s): %s", msg_type, e, exc_info=True)
+            response.message = f"Error inesperado en la comunicación: {str(e)}"
+        finally:
+            response.response_time_ms = (time.time() - start_time) * 1000
+            self._log_fin(msg_type, response)
+
+        return response
+
+    async def registrar_positivo_async(self, req: RegistroPositivoRequest) -> SRTMResponse:
+        return await self._send_request_async(*self._build_registro_positivo(req))
+
+    async def registrar_negativo_async(self, req: RegistroNegativoRequest) -> SRTMResponse:
+        return await self._send_request_async(*self._build_registro_negativo(req))
+
+    async def cancelar_negativo_async(self, req: CancelacionNegativoRequest) -> SRTMResponse:
+        return await self._send_request_async(*self._build_cancelacion_negativo(req))
+
+    async def modificar_positivo_async(self, req: ModificacionPositivoRequest) -> SRTMResponse:
+        return await self._send_request_async(*self._build_modificacion_positivo(req))
+
+    async def cancelar_positivo_async(self, req: CancelacionPositivoRequest) -> SRTMResponse:
+        return await self._send_request_async(*self._build_cancelacion_positivo(req))
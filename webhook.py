@@ -1,5 +1,10 @@
+import atexit
 import logging
+import logging.handlers
+import queue
+from io import BytesIO
 from flask import Flask, request, Response
+from werkzeug.exceptions import RequestEntityTooLarge
 from lxml import etree
 import os
 
@@ -13,10 +18,20 @@ file_handler = logging.FileHandler('logs/webhook.log', mode='a', encoding='utf-8
 file_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
 console_handler = logging.StreamHandler()
 console_handler.setFormatter(logging.Formatter('%(levelname)s: %(message)s'))
-logger.addHandler(file_handler)
-logger.addHandler(console_handler)
+# Los handlers reales corren en el hilo del QueueListener; los hilos de waitress solo encolan.
+log_queue = queue.Queue(-1)
+log_listener = logging.handlers.QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+log_listener.start()
+atexit.register(log_listener.stop)
+logger.addHandler(logging.handlers.QueueHandler(log_queue))
 
 app = Flask(__name__)
+# Las notificaciones SRTM ocupan pocos KB: un cuerpo mayor se rechaza (413) antes de leerlo y parsearlo
+app.config['MAX_CONTENT_LENGTH'] = int(os.getenv("WEBHOOK_MAX_BODY_BYTES", str(256 * 1024)))
+
+# Opciones del parser: sin expansión de entidades, sin accesos de red (DTD externos)
+# y con los límites de tamaño por defecto de libxml2 (huge_tree desactivado)
+_PARSER_OPTIONS = dict(resolve_entities=False, no_network=True, huge_tree=False)
 
 # Diccionario para mapear el TipoMsg con el nombre del elemento de respuesta
 MESSAGE_MAP = {
@@ -26,6 +41,67 @@ MESSAGE_MAP = {
     '4002': 'RespuestaModificacionRegistroPositivo',
     '5002': 'RespuestaCancelacionRegistroPositivo',
 }
+_RESPONSE_ELEMENTS = frozenset(MESSAGE_MAP.values())
+
+def _build_ack_response() -> bytes:
+    """Construye el sobre SOAP de respuesta 'ack' (es siempre el mismo)."""
+    nsmap = {
+        'soapenv': 'http://schemas.xmlsoap.org/soap/envelope/',
+        'xsd': 'http://www.w3.org/2001/XMLSchema',
+        'xsi': 'http://www.w3.org/2001/XMLSchema-instance',
+    }
+    soap_envelope = etree.Element(
+        '{http://schemas.xmlsoap.org/soap/envelope/}Envelope', 
+        nsmap=nsmap
+    )
+    soap_body = etree.SubElement(soap_envelope, '{http://schemas.xmlsoap.org/soap/envelope/}Body')
+    receive_message_response = etree.SubElement(soap_body, '{http://service.client.xcewsmulti.iecisa.es}receiveMessageResponse')
+    receive_message_return = etree.SubElement(receive_message_response, '{http://service.client.xcewsmulti.iecisa.es}receiveMessageReturn')
+    receive_message_return.text = 'ack'
+    return etree.tostring(soap_envelope, pretty_print=True, xml_declaration=True, encoding='UTF-8')
+
+# --- RESPUESTA XML CON EL FORMATO SOLICITADO (constante, se serializa una sola vez) ---
+ACK_RESPONSE_BYTES = _build_ack_response()
+ACK_RESPONSE_TEXT = ACK_RESPONSE_BYTES.decode('utf-8')
+
+# Marcador para distinguir "elemento ausente" de un elemento vacío (text None)
+_NOT_FOUND = object()
+
+def _parse_srtm_message(xml_data: bytes):
+    """
+    Recorre el XML en streaming y devuelve (TipoMsg, TipoRespuesta) sin construir el árbol completo.
+    Se detiene en cuanto tiene el TipoMsg y el TipoRespuesta de su elemento de respuesta
+    (o en cuanto sabe que el TipoMsg no está soportado). Los elementos ya procesados se liberan.
+    """
+    message_type = _NOT_FOUND
+    # Primer TipoRespuesta encontrado bajo cada elemento de respuesta conocido
+    respuestas = {}
+    for _, elem in etree.iterparse(BytesIO(xml_data), events=('end',), **_PARSER_OPTIONS):
+        if elem.tag == 'TipoMsg' and message_type is _NOT_FOUND:
+            message_type = elem.text
+            if message_type not in MESSAGE_MAP:
+                break
+        elif elem.tag == 'TipoRespuesta':
+            parent = elem.getparent()
+            if parent is not None and parent.tag in _RESPONSE_ELEMENTS:
+                respuestas.setdefault(parent.tag, elem.text)
+
+        if message_type is not _NOT_FOUND and MESSAGE_MAP[message_type] in respuestas:
+            break
+
+        elem.clear()
+        while elem.getprevious() is not None:
+            del elem.getparent()[0]
+
+    if message_type is _NOT_FOUND:
+        return None, _NOT_FOUND
+    return message_type, respuestas.get(MESSAGE_MAP.get(message_type), _NOT_FOUND)
+
+@app.errorhandler(RequestEntityTooLarge)
+def handle_body_too_large(e):
+    logger.warning("⚠️ Request body exceeds %s bytes. Rejected.", app.config['MAX_CONTENT_LENGTH'])
+    # 3. Contesta vacío el error
+    return "", 413
 
 @app.route('/srtm_response', methods=['POST'])
 def handle_srtm_response():
@@ -36,77 +112,56 @@ def handle_srtm_response():
 
     # 1. Cambia la validación del Content-Type a 'application/xml'
     if request.content_type not in ['text/xml', 'application/xml']:
-        logger.warning(f"⚠️ Invalid Content-Type: {request.content_type}. Expected 'text/xml' or 'application/xml'.")
+        logger.warning("⚠️ Invalid Content-Type: %s. Expected 'text/xml' or 'application/xml'.", request.content_type)
         # 3. Contesta vacío el error si el formato es inválido
         return "", 404
 
     xml_data = request.data
-    logger.info(f"📄 Raw XML data received:\n{xml_data.decode('utf-8')}")
+    # El cuerpo completo solo se registra en DEBUG (evita decodificarlo y escribirlo en cada notificación)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("📄 Raw XML data received:\n%s", xml_data.decode('utf-8', errors='replace'))
 
     try:
-        root = etree.fromstring(xml_data)
-        
-        # Define namespaces for XPath queries
-        namespaces = {'xsd': 'http://www.w3.org/2001/XMLSchema'}
-        tipo_msg_element = root.xpath(".//TipoMsg", namespaces=namespaces)
-        
+        message_type, response_type = _parse_srtm_message(xml_data)
+
         # 4. Genera la validación para los mensajes 1002, 3002, 4002, 5002 y 2002
-        if not tipo_msg_element or tipo_msg_element[0].text not in MESSAGE_MAP:
-            logger.warning(f"⚠️ Received a message that is not a supported type. Ignoring.")
+        if message_type not in MESSAGE_MAP:
+            logger.warning("⚠️ Received a message that is not a supported type. Ignoring.")
             return "", 200
 
-        message_type = tipo_msg_element[0].text
-        response_element_name = MESSAGE_MAP[message_type]
-
-        # Use the mapped element name to find the response type
-        xpath_query = f".//{response_element_name}/TipoRespuesta"
-        tipo_respuesta_element = root.xpath(xpath_query, namespaces=namespaces)
-
-        if tipo_respuesta_element:
-            response_type = tipo_respuesta_element[0].text
+        if response_type is not _NOT_FOUND:
             if response_type == '1':
-                logger.info(f"✅ Received an 'Aceptada' response for message type {message_type}.")
+                logger.info("✅ Received an 'Aceptada' response for message type %s.", message_type)
             else:
-                logger.warning(f"❌ Received a 'Rechazada' response for message type {message_type}.")
+                logger.warning("❌ Received a 'Rechazada' response for message type %s.", message_type)
             
-            logger.info(f"🎉 Successfully processed message type {message_type} transaction.")
-
-            # --- CONSTRUIR LA RESPUESTA XML CON EL FORMATO SOLICITADO ---
-            nsmap = {
-                'soapenv': 'http://schemas.xmlsoap.org/soap/envelope/',
-                'xsd': 'http://www.w3.org/2001/XMLSchema',
-                'xsi': 'http://www.w3.org/2001/XMLSchema-instance',
-            }
-            soap_envelope = etree.Element(
-                '{http://schemas.xmlsoap.org/soap/envelope/}Envelope', 
-                nsmap=nsmap
-            )
-            soap_body = etree.SubElement(soap_envelope, '{http://schemas.xmlsoap.org/soap/envelope/}Body')
-            receive_message_response = etree.SubElement(soap_body, '{http://service.client.xcewsmulti.iecisa.es}receiveMessageResponse')
-            receive_message_return = etree.SubElement(receive_message_response, '{http://service.client.xcewsmulti.iecisa.es}receiveMessageReturn')
-            receive_message_return.text = 'ack'
-            
-            ack_response = etree.tostring(soap_envelope, pretty_print=True, xml_declaration=True, encoding='UTF-8')
+            logger.info("🎉 Successfully processed message type %s transaction.", message_type)
 
-            logger.info(f"➡️ Sending 'ack' response:\n{ack_response.decode('utf-8')}")
-            return Response(ack_response, mimetype='text/xml')
+            logger.debug("➡️ Sending 'ack' response:\n%s", ACK_RESPONSE_TEXT)
+            return Response(ACK_RESPONSE_BYTES, mimetype='text/xml')
 
         else:
-            logger.error(f"❌ Could not find the TipoRespuesta element for message type {message_type}.")
+            logger.error("❌ Could not find the TipoRespuesta element for message type %s.", message_type)
             # 3. Contesta vacío el error
             return "", 404
 
     except etree.XMLSyntaxError as e:
-        logger.error(f"❌ Failed to parse XML: {e}", exc_info=True)
+        # XML mal formado del remitente: basta el mensaje, sin traceback
+        logger.error("❌ Failed to parse XML: %s", e)
         # 3. Contesta vacío el error
         return "", 404
     except Exception as e:
-        logger.error(f"❌ An unexpected error occurred: {e}", exc_info=True)
+        logger.error("❌ An unexpected error occurred: %s", e, exc_info=True)
         # 3. Contesta vacío el error
         return "", 500
 
 if __name__ == '__main__':
+    from waitress import serve
+
+    # Servidor WSGI de producción con pool de hilos (el servidor de desarrollo de Flask
+    # atiende las notificaciones de SRTM de a una y con el depurador activo).
+    threads = int(os.getenv("WEBHOOK_THREADS", "16"))
     print("🚀 Starting SRTM Webhook...")
     # 2. Cambia el puerto a 6750
-    print("🌍 Listening on http://localhost:6750/srtm_response")
-    app.run(host='0.0.0.0', port=6750, debug=True)
\ No newline at end of file
+    print(f"🌍 Listening on http://localhost:6750/srtm_response ({threads} threads)")
+    serve(app, host='0.0.0.0', port=6750, threads=threads)